@@ -0,0 +1,109 @@
+"""Test-generation throughput against the stub LLM server, by worker concurrency.
+
+Runs BackgroundWorker.generate_test_cases over --items reference events
+with an in-memory test case store, so only the LLM round trips are
+measured. Concurrency 1 is the old one-at-a-time behaviour. --rpm/--tpm
+apply the rate limiter to show it holding throughput at the budget.
+Responses are streamed with --cases test cases each; the time to the
+first parsed test case of a single request is reported against the
+time to the whole response. --batch-size runs each concurrency with at
+most that many samples of one endpoint per prompt (1 is one prompt per
+reference event); the items are spread over --endpoints endpoints.
+
+    python -m benchmarks.bench_generation --items 200 --latency-ms 200 --concurrency 1 8 32
+    python -m benchmarks.bench_generation --items 200 --concurrency 32 --rpm 600
+    python -m benchmarks.bench_generation --items 200 --concurrency 8 --batch-size 1 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+from src.background_worker import BackgroundWorker
+from src.generation.rate_limit import RateLimiter
+from src.generation.test_utils import TestGenerator
+from benchmarks.stub_llm_server import start_stub_server
+
+
+class MemoryTestCaseStore:
+    def __init__(self):
+        self.test_cases = []
+
+    async def store_test_case(self, url, http_method, test_case):
+        self.test_cases.append((url, http_method, test_case))
+        return len(self.test_cases)
+
+
+def make_items(n, endpoints=50):
+    """Reference events with concrete paths, spread over `endpoints` path templates."""
+    return [
+        (i, {"url": f"/endpoint-{i % endpoints}/users/{i}", "path_template": f"/endpoint-{i % endpoints}/users/{{param}}",
+             "http_method": "POST", "request_body": {"name": f"user-{i}"},
+             "status": "200", "timestamp": "2025-01-01T00:00:00"})
+        for i in range(n)
+    ]
+
+
+async def run(items, concurrency, base_url, rpm, tpm, batch_size=1):
+    limiter = RateLimiter(requests_per_minute=rpm, tokens_per_minute=tpm) if (rpm or tpm) else None
+    store = MemoryTestCaseStore()
+    generator = TestGenerator(rate_limiter=limiter, base_url=base_url, max_batch_size=batch_size)
+    worker = BackgroundWorker(store, generator, concurrency=concurrency)
+    try:
+        stats = await worker.generate_test_cases(items)
+    finally:
+        await worker.test_generator.aclose()
+    assert stats['test_cases'] == len(store.test_cases)
+    return stats
+
+
+async def first_test_case(base_url):
+    """Seconds to the first yielded test case and to the end of one streamed generation."""
+    generator = TestGenerator(base_url=base_url)
+    started = time.perf_counter()
+    first = None
+    try:
+        async for chunk in generator.generate_streaming(make_items(1)[0][1]):
+            if first is None and chunk != "[DONE]":
+                first = time.perf_counter() - started
+    finally:
+        await generator.aclose()
+    return first, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--rpm', type=int, default=0)
+    parser.add_argument('--tpm', type=int, default=0)
+    parser.add_argument('--cases', type=int, default=3, help="test cases per response")
+    parser.add_argument('--chunk-delay-ms', type=float, default=5)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1])
+    parser.add_argument('--endpoints', type=int, default=50)
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency_ms / 1000, error_rate=args.error_rate, cases=args.cases,
+                               chunk_delay=args.chunk_delay_ms / 1000)
+    items = make_items(args.items, args.endpoints)
+    try:
+        first, total = asyncio.run(first_test_case(server.base_url))
+        print(f"single request: first test case after {first:.3f}s, response complete after {total:.3f}s")
+        for concurrency in args.concurrency:
+            for batch_size in args.batch_size:
+                server.max_in_flight = 0
+                stats = asyncio.run(run(items, concurrency, server.base_url, args.rpm, args.tpm, batch_size))
+                rate = stats['items'] / stats['seconds'] if stats['seconds'] else 0.0
+                print(f"concurrency {concurrency:>3} batch {batch_size:>3}: {stats['seconds']:7.2f}s "
+                      f"{rate:8.1f} items/s prompts {stats['batches']} test cases {stats['test_cases']} "
+                      f"failed {stats['failed']} peak in flight {server.max_in_flight}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Cost of splitting test cases out of a streamed response, by response length.
+
+The previous generate_streaming appended every chunk to a buffer and
+retried json.loads on the whole buffer, which is quadratic in the
+response length and never splits several objects out of one response.
+JSONObjectScanner looks at each character once and emits every object
+as it closes. Both are fed the same chunked response (a JSON array of
+--cases test cases, --chunk-chars characters per chunk).
+
+    python -m benchmarks.bench_json_stream --cases 5 20 80 --chunk-chars 8
+"""
+import argparse
+import json
+import time
+
+from src.generation.json_stream import JSONObjectScanner
+from benchmarks.stub_llm_server import TEST_CASE
+
+
+def legacy_split(chunks):
+    current_chunk = ""
+    found = []
+    for chunk in chunks:
+        current_chunk += chunk
+        try:
+            json.loads(current_chunk)
+            found.append(current_chunk)
+            current_chunk = ""
+        except json.JSONDecodeError:
+            continue
+    return found
+
+
+def scanner_split(chunks):
+    scanner = JSONObjectScanner()
+    found = []
+    for chunk in chunks:
+        found.extend(scanner.feed(chunk))
+    return found
+
+
+def timed(fn, chunks):
+    started = time.perf_counter()
+    result = fn(chunks)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', type=int, nargs='+', default=[5, 20, 80])
+    parser.add_argument('--chunk-chars', type=int, default=8)
+    args = parser.parse_args()
+
+    for cases in args.cases:
+        text = json.dumps([dict(TEST_CASE, description=f"case {i}") for i in range(cases)], indent=2)
+        chunks = [text[i:i + args.chunk_chars] for i in range(0, len(text), args.chunk_chars)]
+        legacy, legacy_seconds = timed(legacy_split, chunks)
+        scanned, scanner_seconds = timed(scanner_split, chunks)
+        assert [json.loads(obj)['description'] for obj in scanned] == [f"case {i}" for i in range(cases)]
+        print(f"{cases:>4} cases {len(text):>8} chars: legacy {legacy_seconds * 1000:9.1f} ms "
+              f"({len(legacy)} parsed), scanner {scanner_seconds * 1000:7.2f} ms ({len(scanned)} objects)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Time and peak memory of dense all-pairs cosine vs blocked sparse top-k.
+
+Generates synthetic requests for one endpoint, vectorizes them with
+RequestVectorizer and compares the old dense path (toarray +
+cosine_similarity, skipped above --dense-max) with top_k_neighbors.
+Peak memory is measured with tracemalloc.
+
+    python -m benchmarks.bench_topk_similarity --sizes 1000 5000 20000 50000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from src.analysis.vectorizer import RequestVectorizer
+from src.analysis.similarity import top_k_neighbors
+
+
+def make_requests(n, seed=0):
+    rng = random.Random(seed)
+    names = ['alice', 'bob', 'carol', 'dave', 'erin', 'frank']
+    requests = []
+    for i in range(n):
+        body = {
+            'user': {'name': rng.choice(names), 'age': rng.randint(18, 90)},
+            'items': [{'sku': f'SKU-{rng.randint(1, 500)}', 'qty': rng.randint(1, 5)}
+                      for _ in range(rng.randint(1, 4))],
+            'note': ''.join(rng.choice('abcdefghij ') for _ in range(rng.randint(0, 40))),
+        }
+        if rng.random() < 0.01:
+            body = {'payload': "' OR 1=1; DROP TABLE users; --" * rng.randint(1, 3)}
+        requests.append({
+            'path': '/orders',
+            'method': 'POST',
+            'body': body,
+            'query_params': {'page': str(rng.randint(1, 20))},
+            'headers': {'user-agent': rng.choice(['curl/8.0', 'python-requests/2.31', 'Mozilla/5.0'])},
+        })
+    return requests
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 2000, 5000, 10000, 20000])
+    parser.add_argument('--dense-max', type=int, default=10000, help="largest N to run the dense baseline for")
+    parser.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'N':>8} {'dense s':>9} {'dense MiB':>10} {'top-k s':>9} {'top-k MiB':>10}")
+    for n in args.sizes:
+        vectors = RequestVectorizer().fit_transform(make_requests(n))
+
+        if n <= args.dense_max:
+            from sklearn.metrics.pairwise import cosine_similarity
+            dense_time, dense_mem = measure(lambda: cosine_similarity(vectors.toarray()))
+            dense = f"{dense_time:>9.2f} {dense_mem:>10.1f}"
+        else:
+            dense = f"{'-':>9} {'-':>10}"
+
+        topk_time, topk_mem = measure(lambda: top_k_neighbors(vectors, k=args.k))
+        print(f"{n:>8} {dense} {topk_time:>9.2f} {topk_mem:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Accuracy and throughput of the tfidf and hashing vectorizer modes.
+
+Fits each mode on synthetic requests for one endpoint, finds each
+request's nearest neighbours with top_k_neighbors and compares every
+mode against tfidf with an unbounded vocabulary: correlation of the mean
+neighbour similarity, and overlap (Jaccard) of the requests flagged as
+anomalous at the analyzer's 0.7 threshold. Throughput is requests
+vectorized per second for fit_transform and for transform with the
+fitted state.
+
+    python -m benchmarks.bench_vectorizer_modes --sizes 2000 10000 --hash-features 65536 262144
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.analysis.vectorizer import RequestVectorizer
+from src.analysis.similarity import top_k_neighbors
+from benchmarks.bench_topk_similarity import make_requests
+
+
+def run_mode(strings, k, threshold, **kwargs):
+    vectorizer = RequestVectorizer(**kwargs)
+    started = time.perf_counter()
+    vectors = vectorizer.fit_transform_strings(strings)
+    fit_rate = len(strings) / (time.perf_counter() - started)
+
+    restored = RequestVectorizer.from_state(vectorizer.get_state())
+    started = time.perf_counter()
+    restored.transform_strings(strings)
+    transform_rate = len(strings) / (time.perf_counter() - started)
+
+    _, sims = top_k_neighbors(vectors, k=k)
+    scores = sims.mean(axis=1)
+    return fit_rate, transform_rate, scores, set(np.flatnonzero(scores < threshold).tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 10000])
+    parser.add_argument('--hash-features', type=int, nargs='+', default=[2 ** 16, 2 ** 18])
+    parser.add_argument('--max-features', type=int, default=4096, help="tfidf vocabulary size")
+    parser.add_argument('-k', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    print(f"{'N':>7} {'mode':>22} {'fit req/s':>10} {'xform req/s':>12} {'corr':>6} {'flag J':>7} {'flagged':>8}")
+    for n in args.sizes:
+        strings = RequestVectorizer().to_strings(make_requests(n))
+        baseline = run_mode(strings, args.k, args.threshold)
+        modes = [
+            ("tfidf", baseline),
+            (f"tfidf/{args.max_features}",
+             run_mode(strings, args.k, args.threshold, max_features=args.max_features))
+        ]
+        for n_features in args.hash_features:
+            for use_idf in (True, False):
+                label = f"hashing/{n_features}{'+idf' if use_idf else ''}"
+                modes.append((label, run_mode(strings, args.k, args.threshold, mode='hashing',
+                                              n_features=n_features, use_idf=use_idf)))
+
+        for label, (fit_rate, transform_rate, scores, flagged) in modes:
+            corr = np.corrcoef(baseline[2], scores)[0, 1]
+            union = baseline[3] | flagged
+            jaccard = len(baseline[3] & flagged) / len(union) if union else 1.0
+            print(f"{n:>7} {label:>22} {fit_rate:>10.0f} {transform_rate:>12.0f} "
+                  f"{corr:>6.3f} {jaccard:>7.3f} {len(flagged):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare query plans for the analyzer's traffic_events queries.
+
+Runs EXPLAIN ANALYZE for the first chunk read by iter_events_by_endpoint
+and the DISTINCT used by get_unique_endpoints, once forced onto the old
+single-column indexes and once with idx_template_method_timestamp, and prints
+the plans and timings. Needs a populated database (MYSQL_* env vars).
+
+    python -m benchmarks.explain_traffic_queries --hours 24
+"""
+from datetime import datetime, timedelta
+import argparse
+import time
+
+from sqlalchemy import create_engine, text
+
+from src.config import Config
+
+ENDPOINT_QUERY = (
+    "SELECT * FROM traffic_events {hint} "
+    "WHERE path_template = :path AND method = :method AND timestamp BETWEEN :start AND :end "
+    "ORDER BY timestamp, id LIMIT 2000"
+)
+DISTINCT_QUERY = (
+    "SELECT DISTINCT path_template, method FROM traffic_events {hint} WHERE timestamp >= :start"
+)
+HINTS = {
+    'single-column indexes': "IGNORE INDEX (idx_template_method_timestamp)",
+    'composite index': "FORCE INDEX (idx_template_method_timestamp)",
+}
+
+
+def explain(conn, query, params):
+    started = time.perf_counter()
+    plan = conn.execute(text(f"EXPLAIN ANALYZE {query}"), params).scalar()
+    return plan, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--mysql-uri', default=None)
+    args = parser.parse_args()
+
+    engine = create_engine(args.mysql_uri or Config().MYSQL_URI)
+    end = datetime.now()
+    start = end - timedelta(hours=args.hours)
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            "SELECT path_template, method FROM traffic_events WHERE timestamp >= :start "
+            "GROUP BY path_template, method ORDER BY COUNT(*) DESC LIMIT 1"
+        ), {'start': start}).first()
+        if row is None:
+            print("No traffic in the window; load some events first.")
+            return
+        params = {'path': row[0], 'method': row[1], 'start': start, 'end': end}
+        print(f"Hottest endpoint in window: {row[1]} {row[0]}\n")
+
+        for label, query in (('iter_events_by_endpoint', ENDPOINT_QUERY), ('get_unique_endpoints', DISTINCT_QUERY)):
+            for variant, hint in HINTS.items():
+                plan, elapsed = explain(conn, query.format(hint=hint), params)
+                print(f"== {label} / {variant}: {elapsed * 1000:.1f} ms")
+                print(plan)
+                print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Minimal OpenAI-compatible chat completions server for load-testing test generation.
+
+Every POST to .../chat/completions sleeps for --latency-ms and answers
+with --cases generated test cases (a JSON array) for each "Sample N:" in
+the prompt, tagged with its sample_index, and a usage block;
+--error-rate of the requests get a 429 instead. With "stream": true the
+content is sent as server-sent events of --chunk-chars characters,
+--chunk-delay-ms apart. Point the service at it with
+OPENAI_BASE_URL=http://127.0.0.1:8399/v1 (any OPENAI_API_KEY works).
+
+    python -m benchmarks.stub_llm_server --port 8399 --latency-ms 300 --cases 3
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TEST_CASE = {
+    "description": "Stub test case",
+    "category": "functional",
+    "priority": "medium",
+    "request": {"method": "GET", "url": "/stub", "headers": {}, "path_params": {}, "query_params": {}, "body": {}}
+}
+
+SAMPLE_PATTERN = re.compile(r'^Sample (\d+):$', re.MULTILINE)
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.3, error_rate: float = 0.0, content: str = None,
+                 cases: int = 1, chunk_chars: int = 16, chunk_delay: float = 0.005):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.content = content
+        self.cases = cases
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def respond(self, messages) -> str:
+        if self.content is not None:
+            return self.content
+        prompt = messages[-1].get('content', '') if messages else ''
+        sample_indexes = [int(index) for index in SAMPLE_PATTERN.findall(prompt)] or [0]
+        return json.dumps([dict(TEST_CASE, sample_index=index) for index in sample_indexes
+                           for _ in range(self.cases)], indent=2)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if not self.path.endswith('/chat/completions'):
+                return self._send(404, {"error": {"message": "not found"}})
+            if random.random() < server.error_rate:
+                return self._send(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}})
+            content = server.respond(payload.get('messages', []))
+            if payload.get('stream'):
+                return self._send_stream(payload.get('model', 'stub'), content)
+            prompt_tokens = sum(len(m.get('content', '')) for m in payload.get('messages', [])) // 4
+            completion_tokens = len(content) // 4
+            self._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get('model', 'stub'),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_stream(self, model, content):
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        chunks = [{"content": content[i:i + server.chunk_chars]}
+                  for i in range(0, len(content), server.chunk_chars)]
+        for delta, finish_reason in [({"role": "assistant"}, None)] + [(c, None) for c in chunks] + [({}, "stop")]:
+            event = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(server.chunk_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, latency: float = 0.3, error_rate: float = 0.0, content: str = None,
+                      cases: int = 1, chunk_chars: int = 16, chunk_delay: float = 0.005) -> StubLLMServer:
+    """Serve in a background thread; call shutdown() when done."""
+    server = StubLLMServer(('127.0.0.1', port), latency, error_rate, content, cases, chunk_chars, chunk_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8399)
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--cases', type=int, default=3)
+    parser.add_argument('--chunk-chars', type=int, default=16)
+    parser.add_argument('--chunk-delay-ms', type=float, default=5)
+    args = parser.parse_args()
+    server = StubLLMServer(('127.0.0.1', args.port), args.latency_ms / 1000, args.error_rate,
+                           cases=args.cases, chunk_chars=args.chunk_chars, chunk_delay=args.chunk_delay_ms / 1000)
+    print(f"Stub LLM server on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
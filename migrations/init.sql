@@ -1,7 +1,9 @@
 CREATE TABLE IF NOT EXISTS traffic_events (
-    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    id BIGINT AUTO_INCREMENT,
     timestamp DATETIME NOT NULL,
     path VARCHAR(255) NOT NULL,
+    -- Path with identifier segments collapsed, e.g. /users/{param}/orders/{param}
+    path_template VARCHAR(255) NOT NULL,
     method VARCHAR(10) NOT NULL,
     headers JSON,
     path_params JSON,
@@ -10,8 +12,29 @@ CREATE TABLE IF NOT EXISTS traffic_events (
     status INT,
     duration_ms FLOAT,
     response_headers JSON,
+    -- The partitioning column must be part of every unique key
+    PRIMARY KEY (id, timestamp),
     INDEX idx_timestamp (timestamp),
-    INDEX idx_path (path)
+    INDEX idx_template_method_timestamp (path_template, method, timestamp)
+)
+-- Daily partitions are added ahead of time and dropped after the retention
+-- window by `python -m src.cli.partitions`; p_future catches anything beyond.
+PARTITION BY RANGE (TO_DAYS(timestamp)) (
+    PARTITION p_history VALUES LESS THAN (TO_DAYS('2025-01-01')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+);
+
+-- Catalog of observed endpoints, maintained by the ingest path so endpoint
+-- listings never have to scan traffic_events. path holds the path template.
+CREATE TABLE IF NOT EXISTS endpoints (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    path VARCHAR(255) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    first_seen DATETIME NOT NULL,
+    last_seen DATETIME NOT NULL,
+    hit_count BIGINT NOT NULL DEFAULT 0,
+    UNIQUE KEY unique_endpoint_path_method (path, method),
+    INDEX idx_last_seen (last_seen)
 );
 
 CREATE TABLE IF NOT EXISTS request_anomalies (
@@ -21,8 +44,25 @@ CREATE TABLE IF NOT EXISTS request_anomalies (
     anomaly_type VARCHAR(50),
     description TEXT,
     detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- [{id, similarity}] of the nearest traffic events, nearest first
     reference_events JSON,
-    FOREIGN KEY (event_id) REFERENCES traffic_events(id)
+    -- Partitioned tables cannot be referenced by foreign keys. The unique key
+    -- makes re-scoring an event an update instead of a duplicate row.
+    UNIQUE KEY unique_event_anomaly (event_id, anomaly_type),
+    -- Keyset pagination on (detected_at, id); InnoDB appends the primary key
+    INDEX idx_detected_at (detected_at)
+);
+
+-- Anomaly counts per hour, endpoint (path template), type and similarity
+-- decile, written with the anomalies so summaries never scan raw rows.
+CREATE TABLE IF NOT EXISTS anomaly_rollups (
+    hour DATETIME NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    anomaly_type VARCHAR(50) NOT NULL,
+    score_bucket TINYINT NOT NULL,
+    anomaly_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, path, method, anomaly_type, score_bucket)
 );
 
 CREATE TABLE IF NOT EXISTS request_patterns (
@@ -30,6 +70,10 @@ CREATE TABLE IF NOT EXISTS request_patterns (
     path VARCHAR(255),
     method VARCHAR(10),
     pattern_vector JSON,
+    -- Decaying latency histogram and status-class counts for the endpoint
+    baseline JSON,
+    -- High-water mark: id of the last traffic event analysed for this endpoint
+    last_event_id BIGINT,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE KEY unique_path_method (path, method)
 );
@@ -57,4 +101,18 @@ CREATE TABLE  IF NOT EXISTS test_cases (
     request_body JSON,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (suite_id) REFERENCES endpoint_test_suites(id)
-);
\ No newline at end of file
+);
+
+-- Generated test cases keyed by a fingerprint of the normalized request, the
+-- model and the prompt template. Entries expire after a TTL and the least
+-- recently used ones are evicted beyond a size limit.
+CREATE TABLE IF NOT EXISTS generation_cache (
+    fingerprint CHAR(64) PRIMARY KEY,
+    model VARCHAR(50) NOT NULL,
+    test_cases JSON NOT NULL,
+    cost DOUBLE NOT NULL DEFAULT 0,
+    hits BIGINT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL,
+    last_used_at DATETIME NOT NULL,
+    INDEX idx_last_used_at (last_used_at)
+);
@@ -0,0 +1,24 @@
+-- Upgrade an existing deployment to the partitioned traffic_events layout
+-- created by migrations/init.sql. Fresh installs do not need this file.
+--
+-- The PARTITION BY step rebuilds the table; on large tables run it during a
+-- maintenance window (or through pt-online-schema-change / gh-ost).
+
+-- Partitioned tables cannot be referenced by foreign keys. The index MySQL
+-- created for the constraint is kept for event_id lookups.
+ALTER TABLE request_anomalies DROP FOREIGN KEY request_anomalies_ibfk_1;
+
+ALTER TABLE traffic_events
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, timestamp),
+    DROP INDEX idx_path,
+    ADD INDEX idx_path_method_timestamp (path, method, timestamp);
+
+ALTER TABLE traffic_events
+    PARTITION BY RANGE (TO_DAYS(timestamp)) (
+        PARTITION p_history VALUES LESS THAN (TO_DAYS('2025-01-01')),
+        PARTITION p_future VALUES LESS THAN MAXVALUE
+    );
+
+-- Afterwards create daily partitions:
+--   python -m src.cli.partitions --days-ahead 7
@@ -0,0 +1,21 @@
+-- Add the endpoints catalog and backfill it from existing traffic.
+
+CREATE TABLE IF NOT EXISTS endpoints (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    path VARCHAR(255) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    first_seen DATETIME NOT NULL,
+    last_seen DATETIME NOT NULL,
+    hit_count BIGINT NOT NULL DEFAULT 0,
+    UNIQUE KEY unique_endpoint_path_method (path, method),
+    INDEX idx_last_seen (last_seen)
+);
+
+INSERT INTO endpoints (path, method, first_seen, last_seen, hit_count)
+SELECT path, method, MIN(timestamp), MAX(timestamp), COUNT(*)
+FROM traffic_events
+GROUP BY path, method
+ON DUPLICATE KEY UPDATE
+    first_seen = LEAST(endpoints.first_seen, VALUES(first_seen)),
+    last_seen = GREATEST(endpoints.last_seen, VALUES(last_seen)),
+    hit_count = VALUES(hit_count);
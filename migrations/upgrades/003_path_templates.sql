@@ -0,0 +1,33 @@
+-- Store a path template next to every raw path and key endpoint lookups on it.
+-- Existing rows get numeric, UUID, long hex and long opaque token segments collapsed
+-- to {param}, as PathTemplater does; segments learned from traffic at runtime are
+-- only applied to new events.
+
+ALTER TABLE traffic_events
+    ADD COLUMN path_template VARCHAR(255) NULL AFTER path;
+
+UPDATE traffic_events
+SET path_template = REGEXP_REPLACE(
+    REGEXP_REPLACE(path, '\\?.*$', ''),
+    '/([0-9]+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}|[0-9a-fA-F]{16,}|(?=[A-Za-z0-9_=-]*[0-9])(?=[A-Za-z0-9_=-]*[A-Za-z])[A-Za-z0-9_=-]{20,})(?=/|$)',
+    '/{param}'
+)
+WHERE path_template IS NULL;
+
+ALTER TABLE traffic_events
+    MODIFY COLUMN path_template VARCHAR(255) NOT NULL,
+    DROP INDEX idx_path_method_timestamp,
+    ADD INDEX idx_template_method_timestamp (path_template, method, timestamp);
+
+-- The endpoints catalog is keyed by template from now on. It is rebuilt in a
+-- staging table and swapped in atomically, so readers never see it empty.
+DROP TABLE IF EXISTS endpoints_rebuild;
+CREATE TABLE endpoints_rebuild LIKE endpoints;
+
+INSERT INTO endpoints_rebuild (path, method, first_seen, last_seen, hit_count)
+SELECT path_template, method, MIN(timestamp), MAX(timestamp), COUNT(*)
+FROM traffic_events
+GROUP BY path_template, method;
+
+RENAME TABLE endpoints TO endpoints_raw_paths, endpoints_rebuild TO endpoints;
+DROP TABLE endpoints_raw_paths;
@@ -0,0 +1,15 @@
+-- Per-endpoint analysis high-water marks and idempotent anomaly writes.
+
+ALTER TABLE request_patterns
+    ADD COLUMN last_event_id BIGINT NULL AFTER pattern_vector;
+
+-- Remove duplicates left by repeated full-window analysis runs, keeping the
+-- earliest detection of each (event, anomaly type).
+DELETE dup FROM request_anomalies dup
+JOIN request_anomalies keep
+    ON keep.event_id = dup.event_id
+    AND keep.anomaly_type = dup.anomaly_type
+    AND keep.id < dup.id;
+
+ALTER TABLE request_anomalies
+    ADD UNIQUE KEY unique_event_anomaly (event_id, anomaly_type);
@@ -0,0 +1,4 @@
+-- Per-endpoint latency/status baselines used by the latency and status rules.
+
+ALTER TABLE request_patterns
+    ADD COLUMN baseline JSON NULL AFTER pattern_vector;
@@ -0,0 +1,24 @@
+-- Store anomaly reference events as {id, similarity} pairs instead of copies
+-- of the referenced events. Readers load the events by id when needed.
+-- Rows already in the compact form are left alone.
+
+-- GROUP_CONCAT keeps the nearest-first order; raise its limit for long lists
+SET SESSION group_concat_max_len = 1048576;
+
+UPDATE request_anomalies a
+JOIN (
+    SELECT src.id,
+           CAST(CONCAT('[', GROUP_CONCAT(
+               JSON_OBJECT('id', ref.event_id, 'similarity', ref.similarity)
+               ORDER BY ref.position SEPARATOR ','
+           ), ']') AS JSON) AS reference_events
+    FROM request_anomalies src,
+         JSON_TABLE(src.reference_events, '$[*]' COLUMNS (
+             position FOR ORDINALITY,
+             event_id BIGINT PATH '$.id',
+             similarity DOUBLE PATH '$.similarity'
+         )) ref
+    WHERE JSON_CONTAINS_PATH(src.reference_events, 'one', '$[*].path', '$[*].request_body')
+    GROUP BY src.id
+) compact ON compact.id = a.id
+SET a.reference_events = compact.reference_events;
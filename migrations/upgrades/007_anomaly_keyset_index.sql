@@ -0,0 +1,5 @@
+-- Index for keyset pagination of /api/v1/analysis/anomalies on (detected_at, id).
+-- InnoDB secondary indexes end with the primary key, so this covers both columns.
+
+ALTER TABLE request_anomalies
+    ADD INDEX idx_detected_at (detected_at);
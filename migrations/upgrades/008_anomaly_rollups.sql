@@ -0,0 +1,24 @@
+-- Hourly anomaly rollups behind /api/v1/analysis/anomalies/summary, backfilled
+-- from existing anomalies. New anomalies update the rollups as they are stored.
+
+CREATE TABLE IF NOT EXISTS anomaly_rollups (
+    hour DATETIME NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    anomaly_type VARCHAR(50) NOT NULL,
+    score_bucket TINYINT NOT NULL,
+    anomaly_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, path, method, anomaly_type, score_bucket)
+);
+
+INSERT INTO anomaly_rollups (hour, path, method, anomaly_type, score_bucket, anomaly_count)
+SELECT DATE_FORMAT(a.detected_at, '%Y-%m-%d %H:00:00'),
+       t.path_template,
+       t.method,
+       a.anomaly_type,
+       LEAST(GREATEST(FLOOR(COALESCE(a.similarity_score, 0) * 10), 0), 9),
+       COUNT(*)
+FROM request_anomalies a
+JOIN traffic_events t ON t.id = a.event_id
+GROUP BY 1, 2, 3, 4, 5
+ON DUPLICATE KEY UPDATE anomaly_count = VALUES(anomaly_count);
@@ -0,0 +1,12 @@
+-- Persistent cache of generated test cases (see GENERATION_CACHE_* settings).
+
+CREATE TABLE IF NOT EXISTS generation_cache (
+    fingerprint CHAR(64) PRIMARY KEY,
+    model VARCHAR(50) NOT NULL,
+    test_cases JSON NOT NULL,
+    cost DOUBLE NOT NULL DEFAULT 0,
+    hits BIGINT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL,
+    last_used_at DATETIME NOT NULL,
+    INDEX idx_last_used_at (last_used_at)
+);
@@ -1,221 +1,232 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
 import logging
-from .vectorizer import RequestVectorizer
+from .batch import EventBatch, Reservoir
+from .endpoint_model import EndpointModel
+from .vectorizer import DEFAULT_HASH_FEATURES, TFIDF
+from .rules import merge_rule_stats
+from .scoring import AnomalyResult, EndpointJob, EndpointJobResult, EndpointScorer, score_endpoint_job
 from ..storage.mysql import MySQLStorage
-from dataclasses import dataclass
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-@dataclass
-class AnomalyResult:
-    event_id: int
-    similarity_score: float
-    anomaly_type: str
-    description: str
-    reference_events: List[Dict[str, Any]]
-
 class RequestAnalyzer:
-    def __init__(self, storage: MySQLStorage):
+    def __init__(self, storage: MySQLStorage, model_max_age_hours: float = 24,
+                 reference_sample_size: int = 200, max_features: Optional[int] = 4096,
+                 workers: int = 1, fetch_chunk_size: int = 2000, window_sample_size: int = 20000,
+                 vectorizer_mode: str = TFIDF, hash_features: int = DEFAULT_HASH_FEATURES,
+                 body_cache_size: int = 0, rules: Optional[List[Dict[str, Any]]] = None,
+                 baseline_half_life_hours: float = 72, watermark_lag_seconds: float = 300):
         self.storage = storage
-        self.vectorizer = RequestVectorizer()
-        self.similarity_threshold = 0.7
-        logger.info("RequestAnalyzer initialized with similarity threshold: %f", self.similarity_threshold)
+        self.scorer = EndpointScorer(
+            reference_sample_size=reference_sample_size,
+            max_features=max_features,
+            vectorizer_mode=vectorizer_mode,
+            hash_features=hash_features,
+            body_cache_size=body_cache_size,
+            rules=rules,
+            baseline_half_life_hours=baseline_half_life_hours
+        )
+        self.model_max_age_hours = model_max_age_hours
+        self.workers = workers
+        self.fetch_chunk_size = fetch_chunk_size
+        self.window_sample_size = window_sample_size
+        self.watermark_lag_seconds = watermark_lag_seconds
+        self.rule_stats: Dict[str, Dict[str, Any]] = {}
+        logger.info("RequestAnalyzer initialized with similarity threshold: %f, workers: %d",
+                    self.scorer.similarity_threshold, self.workers)
 
     async def analyze_endpoint(self, path: str, method: str, hours: int = 24):
-        """Analyze requests for a specific endpoint."""
+        """Analyze requests for a specific endpoint in this process."""
+        try:
+            await self._analyze(path, method, hours, self._score_local)
+        except Exception as e:
+            logger.error("Error analyzing endpoint %s %s: %s", path, method, str(e), exc_info=True)
+
+    async def _score_local(self, job: EndpointJob) -> EndpointJobResult:
+        return self.scorer.run(job)
+
+    async def _analyze(self, path: str, method: str, hours: int, score):
+        """Score an endpoint's new events; score is an async callable running an EndpointJob.
+
+        Only events newer than the endpoint's watermark (the last analysed
+        event id) are scored, against the persisted model when it is fresh;
+        otherwise the model is refit over the window. The watermark only
+        advances over events older than watermark_lag_seconds, so an event
+        committed late with a lower id is still picked up; younger events
+        are scored again on the next run, which updates their anomalies.
+        Events are streamed in chunks of fetch_chunk_size, and a refit uses
+        a uniform sample of at most window_sample_size events, so memory
+        does not grow with endpoint traffic.
+        """
         end_time = datetime.now()
         start_time = end_time - timedelta(hours=hours)
-        
-        logger.info("Analyzing endpoint %s %s from %s to %s", method, path, start_time, end_time)
-        
-        events = await self.storage.get_events_by_endpoint(path, method, start_time, end_time)
-        
-        if not events or len(events) < 2:
-            logger.warning("Insufficient events for analysis: %d events found", len(events) if events else 0)
-            return
 
-        logger.debug("Processing %d events for analysis", len(events))
+        logger.info("Analyzing endpoint %s %s from %s to %s", method, path, start_time, end_time)
 
-        requests_data = []
-        for event in events:
-            request_data = {
-                'path': event.path,
-                'method': event.method,
-                'body': event.request_body if event.request_body else {},
-                'query_params': event.query_params if event.query_params else {},
-                'headers': event.headers if event.headers else {}
-            }
-            requests_data.append(request_data)
+        state = await self.storage.get_request_pattern(path, method)
+        watermark = state['last_event_id'] if state else None
+        baseline_state = state.get('baseline') if state else None
+        model = self._load_model(path, method, state)
+        settled_id = await self.storage.get_settled_event_id(
+            path, method, start_time, end_time - timedelta(seconds=self.watermark_lag_seconds), after_id=watermark
+        )
+        if settled_id is None:
+            settled_id = watermark or 0
+
+        if model is not None:
+            if await self._restrict_references(model):
+                await self._score_stream(path, method, start_time, end_time, watermark, settled_id,
+                                         model.to_dict(), baseline_state, score)
+                return
+            logger.info("Reference events for %s %s no longer exist; refitting", method, path)
+
+        reservoir = Reservoir(self.window_sample_size)
+        async for chunk in self.storage.iter_events_by_endpoint(
+                path, method, start_time, end_time, chunk_size=self.fetch_chunk_size):
+            reservoir.extend(chunk)
+        if reservoir.seen < 2:
+            logger.warning("Insufficient events for analysis: %d events found", reservoir.seen)
+            return
 
-        try:
-            logger.debug("Vectorizing %d requests", len(requests_data))
-            vectors = self.vectorizer.fit_transform(requests_data)
-            logger.debug("Vector shape: %s", vectors.shape)
-            
-            anomalies = self._find_anomalies(vectors, events)
-            logger.info("Found %d anomalies", len(anomalies))
-            
-            for anomaly in anomalies:
-                logger.debug("Storing anomaly: event_id=%d, score=%f, type=%s", 
-                           anomaly.event_id, anomaly.similarity_score, anomaly.anomaly_type)
-                await self.storage.store_anomaly(
-                    event_id=anomaly.event_id,
-                    similarity_score=anomaly.similarity_score,
-                    anomaly_type=anomaly.anomaly_type,
-                    description=anomaly.description,
-                    reference_events=anomaly.reference_events
-                )
-        except Exception as e:
-            logger.error("Error analyzing endpoint %s %s: %s", path, method, str(e), exc_info=True)
+        sample = EventBatch.from_events(reservoir.items)
+        logger.debug("Processing %d of %d events for analysis", len(sample), reservoir.seen)
+        result = await score(EndpointJob(
+            path=path, method=method, events=sample, watermark=watermark, baseline_state=baseline_state,
+            settled_id=settled_id
+        ))
+        if not reservoir.truncated or result.model_state is None:
+            await self._write_result(result)
+            return
 
-    def _parse_status_code(self, status_value) -> int:
-        """Parse status code from different formats (e.g., '200 OK' or '200')."""
+        # The model was fit on a sample; events outside it are scored against the new model
+        last_event_id = result.last_event_id
+        result.last_event_id = None
+        await self._write_result(result)
+        await self._score_stream(path, method, start_time, end_time, watermark, settled_id, result.model_state,
+                                 result.baseline_state, score,
+                                 skip_ids=set(sample.ids.tolist()), last_event_id=last_event_id)
+
+    async def _score_stream(self, path: str, method: str, start_time: datetime, end_time: datetime,
+                            watermark: Optional[int], settled_id: int, model_state: Dict[str, Any],
+                            baseline_state: Optional[Dict[str, Any]], score, skip_ids=frozenset(),
+                            last_event_id: Optional[int] = None):
+        """Score events after the watermark against a model, one fetched chunk at a time.
+
+        Each chunk's job carries the baseline as updated by the previous chunk.
+        """
+        scored = 0
+        async for chunk in self.storage.iter_events_by_endpoint(
+                path, method, start_time, end_time, after_id=watermark, chunk_size=self.fetch_chunk_size):
+            rows = [row for row in chunk if row.id not in skip_ids]
+            if not rows:
+                continue
+            result = await score(EndpointJob(
+                path=path,
+                method=method,
+                events=EventBatch.from_events(rows),
+                watermark=watermark,
+                model_state=model_state,
+                baseline_state=baseline_state,
+                settled_id=settled_id
+            ))
+            baseline_state = result.baseline_state
+            scored += len(rows)
+            if result.last_event_id is not None:
+                last_event_id = max(last_event_id or 0, result.last_event_id)
+            result.last_event_id = None
+            await self._write_result(result)
+
+        if last_event_id is None:
+            logger.info("No new settled events for %s %s since event %s", method, path, watermark)
+            return
+        logger.debug("Scored %d events for %s %s against its model", scored, method, path)
+        # Advanced only after every chunk's anomalies are written, so a failed run is retried
+        await self.storage.save_request_pattern(path, method, last_event_id=last_event_id)
+
+    async def _restrict_references(self, model: EndpointModel) -> bool:
+        """Drop a model's reference events that no longer exist; False if none are left.
+
+        The model carries the reference texts, so only the ids are looked up.
+        """
+        model.restrict_references(await self.storage.get_existing_event_ids(model.reference_ids))
+        return bool(model.reference_ids)
+
+    def _load_model(self, path: str, method: str, state: Optional[Dict[str, Any]]) -> Optional[EndpointModel]:
+        """Build the persisted model for an endpoint unless it is missing or stale."""
+        if not state or not state.get('pattern_vector'):
+            return None
         try:
-            if isinstance(status_value, int):
-                return status_value
-                
-            status_str = str(status_value)
-            # Extract first number found in the string
-            status_code = int(status_str.split()[0])
-            return status_code
-        except (ValueError, IndexError) as e:
-            logger.warning("Failed to parse status code from '%s': %s", status_value, str(e))
-            return 0
-
-    def _find_anomalies(self, vectors, events) -> List[AnomalyResult]:
-        """Find anomalies in the vectorized requests."""
-        from sklearn.metrics.pairwise import cosine_similarity
-        import numpy as np
-
-        logger.debug("Calculating similarity matrix for %d vectors", len(vectors))
-        similarities = cosine_similarity(vectors)
-        anomalies = []
-
-        logger.info("Starting anomaly detection for %d events", len(events))
-        
-        for i, event in enumerate(events):
-            # Convert event.id to int if it's not already
-            event_id = int(event.id) if hasattr(event, 'id') else i
-            logger.debug("Analyzing event %d: %s %s", event_id, event.method, event.path)
-            
-            # Initialize anomaly flags
-            is_anomaly = False
-            anomaly_reasons = []
-            
-            # Check for suspicious patterns in query parameters
-            if event.query_params:
-                logger.debug("Checking query parameters for event %d: %s", event_id, event.query_params)
-                suspicious_patterns = ['OR 1=1', 'DROP TABLE', ';']
-                for pattern in suspicious_patterns:
-                    if any(pattern.lower() in str(v).lower() for v in event.query_params.values()):
-                        is_anomaly = True
-                        reason = f"Suspicious SQL pattern found: {pattern}"
-                        anomaly_reasons.append(reason)
-                        logger.warning("Event %d: %s", event_id, reason)
-
-            # Check for suspicious headers
-            if event.headers:
-                logger.debug("Checking headers for event %d: %s", event_id, event.headers)
-                suspicious_headers = ['sqlmap', 'scanner', 'attack']
-                for header in suspicious_headers:
-                    if any(header.lower() in str(v).lower() for v in event.headers.values()):
-                        is_anomaly = True
-                        reason = f"Suspicious header found: {header}"
-                        anomaly_reasons.append(reason)
-                        logger.warning("Event %d: %s", event_id, reason)
-
-            # Check for unusual HTTP methods
-            unusual_methods = ['TRACE', 'CONNECT', 'OPTIONS']
-            if event.method in unusual_methods:
-                is_anomaly = True
-                reason = f"Unusual HTTP method: {event.method}"
-                anomaly_reasons.append(reason)
-                logger.warning("Event %d: %s", event_id, reason)
-
-            # Check for abnormal response times
-            if hasattr(event, 'duration_ms'):
-                try:
-                    duration = float(event.duration_ms)
-                    logger.debug("Checking response time for event %d: %.2fms", event_id, duration)
-                    if duration > 1000:  # Over 1 second
-                        is_anomaly = True
-                        reason = f"Abnormal response time: {duration}ms"
-                        anomaly_reasons.append(reason)
-                        logger.warning("Event %d: %s", event_id, reason)
-                except (ValueError, TypeError):
-                    logger.warning("Invalid duration value for event %d: %s", event_id, event.duration_ms)
-
-            # Check for error status codes
-            if hasattr(event, 'status'):
-                status_code = self._parse_status_code(event.status)
-                logger.debug("Checking status code for event %d: %s (parsed as %d)", 
-                            event_id, event.status, status_code)
-                
-                if status_code >= 400:
-                    is_anomaly = True
-                    reason = f"Error status code: {event.status}"
-                    anomaly_reasons.append(reason)
-                    logger.warning("Event %d: %s", event_id, reason)
-
-            # Check request similarity
-            request_similarities = similarities[i].copy()
-            request_similarities[i] = 0
-            max_similarity = float(np.max(request_similarities))
-            logger.debug("Event %d max similarity score: %f", event_id, max_similarity)
-            
-            if max_similarity < self.similarity_threshold:
-                is_anomaly = True
-                reason = f"Unusual request pattern (similarity: {max_similarity:.2f})"
-                anomaly_reasons.append(reason)
-                logger.warning("Event %d: %s", event_id, reason)
-
-            if is_anomaly:
-                logger.info("Anomaly detected for event %d with %d reasons", 
-                        event_id, len(anomaly_reasons))
-                
-                similar_indices = np.argsort(request_similarities)[-3:]
-                logger.debug("Most similar events for %d: %s", 
-                            event_id, similar_indices.tolist())
-                
-                reference_events = []
-                for idx in similar_indices:
-                    ref_event = events[idx]
-                    ref_event_id = int(ref_event.id) if hasattr(ref_event, 'id') else idx
-                    reference_events.append({
-                        'id': ref_event_id,
-                        'timestamp': ref_event.timestamp.isoformat(),
-                        'path': ref_event.path,
-                        'method': ref_event.method,
-                        'request_body': ref_event.request_body,
-                        'status': str(ref_event.status),  # Keep original status string
-                        'similarity': float(request_similarities[idx])
-                    })
-
-                anomaly = AnomalyResult(
-                    event_id=event_id,
-                    similarity_score=max_similarity,
-                    anomaly_type='request_pattern_anomaly',
-                    description='; '.join(anomaly_reasons),
-                    reference_events=reference_events
-                )
-                
-                logger.info("Created anomaly result for event %d: %s", 
-                        event_id, anomaly.description)
-                anomalies.append(anomaly)
-            else:
-                logger.debug("No anomalies detected for event %d", event_id)
-
-        logger.info("Anomaly detection complete. Found %d anomalies in %d events", 
-                    len(anomalies), len(events))
-        return anomalies
+            model = EndpointModel.from_dict(path, method, state['pattern_vector'])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning("Ignoring unreadable model for %s %s: %s", method, path, str(e))
+            return None
+        if model.is_stale(self.model_max_age_hours):
+            logger.info("Model for %s %s is stale (trained at %s); refitting", method, path, model.trained_at)
+            return None
+        if model.vectorizer_state.get('mode', TFIDF) != self.scorer.vectorizer_mode:
+            logger.info("Model for %s %s uses a different vectorizer mode; refitting", method, path)
+            return None
+        return model
+
+    async def _write_result(self, result: EndpointJobResult):
+        """Persist anomalies, then the new model and baseline, then the watermark."""
+        logger.info("Found %d anomalies for %s %s", len(result.anomalies), result.method, result.path)
+        merge_rule_stats(self.rule_stats, result.rule_stats)
+        await self.storage.store_anomalies(result.anomalies)
+
+        if result.model_state is not None:
+            await self.storage.save_request_pattern(result.path, result.method, pattern_vector=result.model_state)
+            logger.info("Saved model for %s %s (%d reference events)",
+                        result.method, result.path, len(result.model_state['reference_ids']))
+        if result.baseline_state is not None:
+            await self.storage.save_request_pattern(result.path, result.method, baseline=result.baseline_state)
+        if result.last_event_id is not None:
+            # Advanced only after the anomalies are written, so a failed run is retried
+            await self.storage.save_request_pattern(result.path, result.method, last_event_id=result.last_event_id)
 
     async def analyze_recent_traffic(self, hours: int = 24):
         """Analyze all traffic from recent hours."""
         logger.info("Starting analysis of recent traffic for past %d hours", hours)
         endpoints = await self.storage.get_unique_endpoints(hours)
         logger.info("Found %d unique endpoints to analyze", len(endpoints))
-        
-        for path, method in endpoints:
-            await self.analyze_endpoint(path, method, hours)
\ No newline at end of file
+        self.rule_stats = {}
+
+        if self.workers <= 1:
+            for path, method in endpoints:
+                await self.analyze_endpoint(path, method, hours)
+        else:
+            await self._analyze_parallel(endpoints, hours)
+
+        for name, counters in self.rule_stats.items():
+            logger.info("Rule %s: %d hits in %d events, %.3fs",
+                        name, counters['hits'], counters['events'], counters['seconds'])
+
+    async def _analyze_parallel(self, endpoints, hours: int):
+        """Score endpoints in a process pool, writing results as each job finishes.
+
+        Events are loaded and results written in this process. At most
+        2 * workers endpoints are in progress at once so memory stays bounded.
+        """
+        loop = asyncio.get_running_loop()
+        settings = self.scorer.settings()
+        # spawn: forking a threaded web worker can deadlock
+        context = multiprocessing.get_context('spawn')
+        in_progress = asyncio.Semaphore(self.workers * 2)
+
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            async def score(job: EndpointJob) -> EndpointJobResult:
+                return await loop.run_in_executor(pool, score_endpoint_job, job, settings)
+
+            async def run(path: str, method: str):
+                async with in_progress:
+                    try:
+                        await self._analyze(path, method, hours, score)
+                    except Exception as e:
+                        logger.error("Error analyzing endpoint %s %s: %s", path, method, str(e), exc_info=True)
+
+            await asyncio.gather(*(run(path, method) for path, method in endpoints))
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional
+import numpy as np
+
+# Log-spaced latency bins from 0.1 ms to 1 hour; each bin spans ~3.5%.
+LATENCY_BIN_EDGES = np.geomspace(0.1, 3.6e6, 513)
+LOG_BIN_EDGES = np.log(LATENCY_BIN_EDGES)
+BIN_COUNT = len(LATENCY_BIN_EDGES) - 1
+BASELINE_VERSION = 1
+# Scales MAD to a standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+
+@dataclass
+class EndpointBaseline:
+    """Decaying latency histogram and status-class counts for one endpoint.
+
+    Counts from earlier runs are multiplied by 0.5 ** (hours elapsed /
+    half_life_hours) before new events are added, so the baseline follows
+    the endpoint's recent behaviour while staying a fixed-size JSON
+    document. Median, MAD and p99 are read off the histogram.
+    """
+    latency_counts: np.ndarray = field(default_factory=lambda: np.zeros(BIN_COUNT))
+    status_counts: np.ndarray = field(default_factory=lambda: np.zeros(6))  # index = status // 100, 0 = unknown
+    updated_at: Optional[datetime] = None
+
+    @property
+    def latency_samples(self) -> float:
+        return float(self.latency_counts.sum())
+
+    @property
+    def status_samples(self) -> float:
+        return float(self.status_counts.sum())
+
+    def update(self, durations: np.ndarray, status_codes: np.ndarray, half_life_hours: float = 72,
+               now: Optional[datetime] = None):
+        """Decay the stored counts and add a batch of durations (NaN = unknown) and status codes."""
+        now = now or datetime.now()
+        if self.updated_at is not None and half_life_hours > 0:
+            hours = max((now - self.updated_at).total_seconds() / 3600.0, 0.0)
+            decay = 0.5 ** (hours / half_life_hours)
+            self.latency_counts = self.latency_counts * decay
+            self.status_counts = self.status_counts * decay
+        known = durations[~np.isnan(durations)]
+        if len(known):
+            bins = np.clip(np.searchsorted(LATENCY_BIN_EDGES, known, side='right') - 1, 0, BIN_COUNT - 1)
+            self.latency_counts = self.latency_counts + np.bincount(bins, minlength=BIN_COUNT)
+        if len(status_codes):
+            classes = np.where((status_codes >= 100) & (status_codes < 600), status_codes // 100, 0)
+            self.status_counts = self.status_counts + np.bincount(classes, minlength=6)
+        self.updated_at = now
+
+    def _latency_cdf(self, x: float) -> float:
+        """Fraction of samples below x, interpolating log-linearly within bins."""
+        if x <= LATENCY_BIN_EDGES[0]:
+            return 0.0
+        cumulative = np.concatenate(([0.0], np.cumsum(self.latency_counts)))
+        return float(np.interp(np.log(x), LOG_BIN_EDGES, cumulative)) / cumulative[-1]
+
+    def latency_quantile(self, q: float) -> float:
+        """Quantile of the latency histogram, interpolated geometrically within the bin."""
+        total = self.latency_samples
+        if total <= 0:
+            return float('nan')
+        populated = np.flatnonzero(self.latency_counts > 0)
+        cumulative = np.cumsum(self.latency_counts)[populated]
+        # The first populated bin whose cumulative count reaches the target holds the quantile
+        target = min(max(q, 0.0), 1.0) * total
+        index = min(int(np.searchsorted(cumulative, target, side='left')), len(populated) - 1)
+        bin_ = populated[index]
+        count = self.latency_counts[bin_]
+        fraction = min(max((target - (cumulative[index] - count)) / count, 0.0), 1.0)
+        low, high = LOG_BIN_EDGES[bin_], LOG_BIN_EDGES[bin_ + 1]
+        return float(np.exp(low + fraction * (high - low)))
+
+    def latency_stats(self) -> Dict[str, float]:
+        """Median, MAD and p99 of the latency baseline (NaN when empty)."""
+        median = self.latency_quantile(0.5)
+        if np.isnan(median):
+            return {'median': median, 'mad': median, 'p99': median}
+        # MAD solves CDF(median + t) - CDF(median - t) = 0.5; bisect on t
+        low, high = 0.0, float(LATENCY_BIN_EDGES[-1])
+        for _ in range(60):
+            mid = (low + high) / 2
+            if self._latency_cdf(median + mid) - self._latency_cdf(median - mid) < 0.5:
+                low = mid
+            else:
+                high = mid
+        return {'median': median, 'mad': high, 'p99': self.latency_quantile(0.99)}
+
+    def latency_limit(self, mad_k: float, p99_factor: float, min_ms: float) -> float:
+        """Durations above this are outliers: beyond p99_factor x p99 and mad_k robust deviations."""
+        stats = self.latency_stats()
+        return max(float(min_ms), p99_factor * stats['p99'], stats['median'] + mad_k * MAD_SCALE * stats['mad'])
+
+    def status_class_rates(self) -> np.ndarray:
+        """Share of events per status class (index = status // 100)."""
+        total = self.status_samples
+        return self.status_counts / total if total > 0 else np.zeros(6)
+
+    def to_dict(self) -> Dict[str, Any]:
+        populated = np.flatnonzero(self.latency_counts > 1e-6)
+        return {
+            'version': BASELINE_VERSION,
+            'latency_bins': populated.tolist(),
+            'latency_counts': [round(float(c), 4) for c in self.latency_counts[populated]],
+            'status_counts': [round(float(c), 4) for c in self.status_counts],
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'EndpointBaseline':
+        """Rebuild a baseline; a missing or incompatible document gives an empty one."""
+        if not data or data.get('version') != BASELINE_VERSION:
+            return cls()
+        latency_counts = np.zeros(BIN_COUNT)
+        latency_counts[np.asarray(data['latency_bins'], dtype=np.int64)] = data['latency_counts']
+        return cls(
+            latency_counts=latency_counts,
+            status_counts=np.asarray(data['status_counts'], dtype=np.float64),
+            updated_at=datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None
+        )
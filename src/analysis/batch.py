@@ -0,0 +1,138 @@
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence
+import random
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Row view with the same attribute names as TrafficEvent
+EventRow = namedtuple('EventRow', [
+    'id', 'timestamp', 'path', 'method', 'request_body', 'query_params', 'headers', 'status', 'duration_ms'
+])
+
+
+def parse_status_code(status_value) -> int:
+    """Parse status code from different formats (e.g., '200 OK' or '200'); 0 if unparsable."""
+    if isinstance(status_value, int):
+        return status_value
+    try:
+        return int(str(status_value).split()[0])
+    except (ValueError, IndexError):
+        logger.debug("Failed to parse status code from '%s'", status_value)
+        return 0
+
+
+@dataclass
+class EventBatch:
+    """Columnar copy of the traffic event fields used by analysis.
+
+    Cheap to pickle compared with ORM objects, so batches can be shipped to
+    worker processes. duration_ms uses NaN for missing values.
+    """
+    ids: np.ndarray
+    timestamps: List[datetime]
+    paths: List[str]
+    methods: List[str]
+    request_bodies: List[Any]
+    query_params: List[Any]
+    headers: List[Any]
+    statuses: List[Any]
+    durations: np.ndarray
+    _status_codes: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_events(cls, events: Sequence) -> 'EventBatch':
+        return cls(
+            ids=np.fromiter((int(e.id) for e in events), dtype=np.int64, count=len(events)),
+            timestamps=[e.timestamp for e in events],
+            paths=[e.path for e in events],
+            methods=[e.method for e in events],
+            request_bodies=[e.request_body for e in events],
+            query_params=[e.query_params for e in events],
+            headers=[e.headers for e in events],
+            statuses=[e.status for e in events],
+            durations=np.fromiter(
+                (np.nan if e.duration_ms is None else float(e.duration_ms) for e in events),
+                dtype=np.float64, count=len(events)
+            )
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def status_codes(self) -> np.ndarray:
+        """Statuses parsed to integers (0 when unparsable), computed once per batch."""
+        if self._status_codes is None:
+            self._status_codes = np.fromiter(
+                (parse_status_code(status) for status in self.statuses), dtype=np.int64, count=len(self)
+            )
+        return self._status_codes
+
+    def take(self, indices: Sequence[int]) -> 'EventBatch':
+        return EventBatch(
+            ids=self.ids[list(indices)],
+            timestamps=[self.timestamps[i] for i in indices],
+            paths=[self.paths[i] for i in indices],
+            methods=[self.methods[i] for i in indices],
+            request_bodies=[self.request_bodies[i] for i in indices],
+            query_params=[self.query_params[i] for i in indices],
+            headers=[self.headers[i] for i in indices],
+            statuses=[self.statuses[i] for i in indices],
+            durations=self.durations[list(indices)]
+        )
+
+    def row(self, i: int) -> EventRow:
+        duration = self.durations[i]
+        return EventRow(
+            int(self.ids[i]), self.timestamps[i], self.paths[i], self.methods[i], self.request_bodies[i],
+            self.query_params[i], self.headers[i], self.statuses[i],
+            None if np.isnan(duration) else float(duration)
+        )
+
+    def rows(self) -> Iterator[EventRow]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def request_data(self) -> List[Dict[str, Any]]:
+        """Request dicts in the shape RequestVectorizer expects."""
+        return [
+            {
+                'path': self.paths[i],
+                'method': self.methods[i],
+                'body': self.request_bodies[i] if self.request_bodies[i] else {},
+                'query_params': self.query_params[i] if self.query_params[i] else {},
+                'headers': self.headers[i] if self.headers[i] else {}
+            }
+            for i in range(len(self))
+        ]
+
+
+class Reservoir:
+    """Uniform random sample of at most size items from a stream (Algorithm R)."""
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.items: List[Any] = []
+        self.seen = 0
+        self._random = random.Random(seed)
+
+    def add(self, item: Any):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        slot = self._random.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = item
+
+    def extend(self, items: Iterable[Any]):
+        for item in items:
+            self.add(item)
+
+    @property
+    def truncated(self) -> bool:
+        return self.seen > len(self.items)
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+
+
+def flatten_json(data: Any) -> Dict[Any, str]:
+    """Flatten nested JSON into key-value pairs.
+
+    Nested keys are joined with '.', list items by index, and a non-dict
+    value is returned as {'value': str(data)}. Walks the structure with an
+    explicit stack instead of recursing, writing straight into one dict;
+    for duplicate keys the last value in document order wins.
+    """
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        try:
+            return {'value': str(data)}
+        except Exception:
+            return {}
+
+    flat: Dict[Any, str] = {}
+    # Frames are (prefix, iterator, is_dict); a parent's iterator resumes
+    # where it stopped once the child frame is exhausted.
+    stack = [('', iter(data.items()), True)]
+    while stack:
+        prefix, items, is_dict = stack[-1]
+        for k, v in items:
+            if is_dict:
+                key = f"{prefix}.{k}" if prefix else k
+                if isinstance(v, dict):
+                    stack.append((key, iter(v.items()), True))
+                    break
+                if isinstance(v, list):
+                    stack.append((key, iter(enumerate(v)), False))
+                    break
+                flat[key] = str(v)
+            else:
+                key = f"{prefix}.{k}"
+                if isinstance(v, dict):
+                    stack.append((key, iter(v.items()), True))
+                    break
+                flat[key] = str(v)
+        else:
+            stack.pop()
+    return flat
+
+
+def body_parts(body: Any) -> List[str]:
+    return [f"body.{k}:{v}" for k, v in flatten_json(body).items()]
+
+
+class BodyCache:
+    """LRU of canonical body parts keyed by a digest of the body's JSON text.
+
+    Many requests to an endpoint repeat the same body, and json.dumps is
+    much cheaper than flattening. Keys are 16-byte blake2b digests, so the
+    cache does not hold on to large bodies' text. The JSON keeps the body's
+    key order, so reordered bodies are separate entries. Bodies that are
+    not JSON serializable are flattened without caching.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[bytes, Tuple[str, ...]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def body_parts(self, body: Any) -> Tuple[str, ...]:
+        try:
+            text = json.dumps(body, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return tuple(body_parts(body))
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        parts = self._entries.get(key)
+        if parts is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return parts
+        self.misses += 1
+        parts = self._entries[key] = tuple(body_parts(body))
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return parts
+
+
+def request_to_string(request_data: Dict[str, Any], body_cache: Optional[BodyCache] = None) -> str:
+    """Canonical string of a request: sorted 'section.key:value' parts joined by spaces."""
+    parts = [f"path:{request_data.get('path', '')}", f"method:{request_data.get('method', '')}"]
+    body = request_data.get('body', {})
+    parts.extend(body_cache.body_parts(body) if body_cache is not None else body_parts(body))
+    for k, v in flatten_json(request_data.get('query_params', {})).items():
+        parts.append(f"query.{k}:{v}")
+    for header, value in request_data.get('headers', {}).items():
+        parts.append(f"header.{header}:{value}")
+    parts.sort()
+    return ' '.join(parts)
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+import random
+
+from .vectorizer import RequestVectorizer
+
+MODEL_VERSION = 1
+
+
+@dataclass
+class EndpointModel:
+    """Fitted vectorizer plus a reference sample of normal requests for one endpoint.
+
+    Persisted as the pattern_vector JSON of request_patterns so later runs
+    can score new events against it without refitting over the window.
+    """
+    path: str
+    method: str
+    vectorizer_state: Dict[str, Any]
+    reference_ids: List[int]
+    reference_texts: List[str]
+    trained_at: datetime
+    trained_on: int = 0
+    version: int = MODEL_VERSION
+    _vectorizer: Optional[RequestVectorizer] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def fit(cls, path: str, method: str, vectorizer: RequestVectorizer, event_ids: List[int],
+            texts: List[str], sample_size: int, exclude_ids=(), seed: Optional[int] = None) -> 'EndpointModel':
+        """Build a model from an already fitted vectorizer and the texts it was fitted on.
+
+        The reference sample is drawn from events not in exclude_ids (typically
+        the anomalies just found), falling back to all events.
+        """
+        excluded = set(exclude_ids)
+        candidates = [i for i, event_id in enumerate(event_ids) if event_id not in excluded]
+        if not candidates:
+            candidates = list(range(len(event_ids)))
+        if len(candidates) > sample_size:
+            candidates = sorted(random.Random(seed).sample(candidates, sample_size))
+        return cls(
+            path=path,
+            method=method,
+            vectorizer_state=vectorizer.get_state(),
+            reference_ids=[int(event_ids[i]) for i in candidates],
+            reference_texts=[texts[i] for i in candidates],
+            trained_at=datetime.now(),
+            trained_on=len(event_ids),
+            _vectorizer=vectorizer
+        )
+
+    @property
+    def vectorizer(self) -> RequestVectorizer:
+        if self._vectorizer is None:
+            self._vectorizer = RequestVectorizer.from_state(self.vectorizer_state)
+        return self._vectorizer
+
+    def is_stale(self, max_age_hours: float) -> bool:
+        return self.version != MODEL_VERSION or datetime.now() - self.trained_at > timedelta(hours=max_age_hours)
+
+    def restrict_references(self, available_ids) -> None:
+        """Drop reference events that no longer exist (e.g. expired partitions)."""
+        available = set(available_ids)
+        keep = [i for i, ref_id in enumerate(self.reference_ids) if ref_id in available]
+        self.reference_ids = [self.reference_ids[i] for i in keep]
+        self.reference_texts = [self.reference_texts[i] for i in keep]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'vectorizer': self.vectorizer_state,
+            'reference_ids': self.reference_ids,
+            'reference_texts': self.reference_texts,
+            'trained_at': self.trained_at.isoformat(),
+            'trained_on': self.trained_on
+        }
+
+    @classmethod
+    def from_dict(cls, path: str, method: str, data: Dict[str, Any]) -> 'EndpointModel':
+        return cls(
+            path=path,
+            method=method,
+            vectorizer_state=data['vectorizer'],
+            reference_ids=data['reference_ids'],
+            reference_texts=data['reference_texts'],
+            trained_at=datetime.fromisoformat(data['trained_at']),
+            trained_on=data.get('trained_on', 0),
+            version=data.get('version', 0)
+        )
@@ -0,0 +1,291 @@
+from typing import List, Dict, Any, Optional, Sequence
+import json
+import re
+import time
+import logging
+import numpy as np
+
+from .baselines import EndpointBaseline
+from .batch import EventBatch
+
+logger = logging.getLogger(__name__)
+
+# Separators for the per-field match text; no pattern can contain them
+VALUE_SEPARATOR = '\x1f'
+EVENT_SEPARATOR = '\x1e'
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        'name': 'sql_pattern',
+        'type': 'pattern',
+        'field': 'query_params',
+        'patterns': ['OR 1=1', 'DROP TABLE', ';'],
+        'reason': 'Suspicious SQL pattern found: {match}'
+    },
+    {
+        'name': 'suspicious_header',
+        'type': 'pattern',
+        'field': 'headers',
+        'patterns': ['sqlmap', 'scanner', 'attack'],
+        'reason': 'Suspicious header found: {match}'
+    },
+    {
+        'name': 'unusual_method',
+        'type': 'method',
+        'methods': ['TRACE', 'CONNECT', 'OPTIONS'],
+        'reason': 'Unusual HTTP method: {value}'
+    },
+    {
+        'name': 'slow_response',
+        'type': 'latency',
+        'mad_k': 5.0,
+        'p99_factor': 1.5,
+        'min_ms': 50,
+        'min_samples': 30,
+        'fallback_ms': 1000,
+        'reason': 'Abnormal response time: {value}ms'
+    },
+    {
+        'name': 'error_status',
+        'type': 'status',
+        'min_status': 400,
+        'max_class_rate': 0.05,
+        'min_samples': 30,
+        'reason': 'Error status code: {value}'
+    }
+]
+
+PATTERN_FIELDS = {
+    'query_params': 'query_params',
+    'headers': 'headers',
+    'request_body': 'request_bodies',
+    'path': 'paths'
+}
+
+
+def load_rules(path: str) -> List[Dict[str, Any]]:
+    """Read a JSON list of rule definitions (same shape as DEFAULT_RULES)."""
+    with open(path, encoding='utf-8') as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise ValueError(f"{path}: expected a JSON list of rules")
+    return rules
+
+
+class Rule:
+    """A heuristic check evaluated over a whole EventBatch.
+
+    Counters accumulate until reset: events evaluated, events hit and
+    seconds spent (shared pattern scans are split between their rules).
+    """
+    type = None
+
+    def __init__(self, name: str, reason: str):
+        self.name = name
+        self.reason = reason
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.events = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def evaluate(self, events: EventBatch, reasons: List[List[str]], context: Dict[str, Any]) -> int:
+        """Append a reason for every matching event; returns the number of events hit."""
+        raise NotImplementedError
+
+
+class PatternRule(Rule):
+    """Case-insensitive substring patterns in the values of one event field."""
+    type = 'pattern'
+
+    def __init__(self, name: str, reason: str, field: str, patterns: Sequence[str]):
+        super().__init__(name, reason)
+        if field not in PATTERN_FIELDS:
+            raise ValueError(f"Rule {name}: unsupported field {field!r}")
+        self.field = field
+        self.patterns = list(patterns)
+        self.lowered = [pattern.lower() for pattern in self.patterns]
+
+    def evaluate(self, events, reasons, context):
+        texts, candidates = context['scans'][self.field]
+        hit = 0
+        for i in candidates:
+            matched = False
+            for pattern, lowered in zip(self.patterns, self.lowered):
+                if lowered in texts[i]:
+                    reasons[i].append(self.reason.format(match=pattern))
+                    matched = True
+            hit += matched
+        return hit
+
+
+class MethodRule(Rule):
+    type = 'method'
+
+    def __init__(self, name: str, reason: str, methods: Sequence[str]):
+        super().__init__(name, reason)
+        self.methods = list(methods)
+
+    def evaluate(self, events, reasons, context):
+        flagged = np.flatnonzero(np.isin(np.asarray(events.methods, dtype=object), self.methods))
+        for i in flagged:
+            reasons[i].append(self.reason.format(value=events.methods[i]))
+        return len(flagged)
+
+
+class LatencyRule(Rule):
+    """Flags responses that are outliers against the endpoint's latency baseline.
+
+    An event must exceed p99_factor x p99, median + mad_k robust standard
+    deviations (from the MAD) and min_ms. Until the baseline holds
+    min_samples durations the fixed fallback_ms limit is used.
+    """
+    type = 'latency'
+
+    def __init__(self, name: str, reason: str, mad_k: float = 5.0, p99_factor: float = 1.5,
+                 min_ms: float = 50, min_samples: int = 30, fallback_ms: float = 1000):
+        super().__init__(name, reason)
+        self.mad_k = mad_k
+        self.p99_factor = p99_factor
+        self.min_ms = min_ms
+        self.min_samples = min_samples
+        self.fallback_ms = fallback_ms
+
+    def threshold(self, baseline: EndpointBaseline) -> float:
+        if baseline.latency_samples < self.min_samples:
+            return float(self.fallback_ms)
+        return baseline.latency_limit(self.mad_k, self.p99_factor, self.min_ms)
+
+    def evaluate(self, events, reasons, context):
+        limit = self.threshold(context['baseline'])
+        with np.errstate(invalid='ignore'):
+            flagged = np.flatnonzero(events.durations > limit)
+        for i in flagged:
+            reasons[i].append(self.reason.format(value=float(events.durations[i])))
+        return len(flagged)
+
+
+class StatusRule(Rule):
+    """Flags statuses >= min_status unless that status class is routine for the endpoint.
+
+    A class (4xx, 5xx) is routine when it makes up more than
+    max_class_rate of the baseline, once the baseline has min_samples.
+    """
+    type = 'status'
+
+    def __init__(self, name: str, reason: str, min_status: int = 400, max_class_rate: float = 1.0,
+                 min_samples: int = 30):
+        super().__init__(name, reason)
+        self.min_status = min_status
+        self.max_class_rate = max_class_rate
+        self.min_samples = min_samples
+
+    def evaluate(self, events, reasons, context):
+        codes = events.status_codes
+        flagged = codes >= self.min_status
+        baseline = context['baseline']
+        if baseline.status_samples >= self.min_samples:
+            routine = baseline.status_class_rates() > self.max_class_rate
+            classes = np.where((codes >= 100) & (codes < 600), codes // 100, 0)
+            flagged &= ~routine[classes]
+        flagged = np.flatnonzero(flagged)
+        for i in flagged:
+            reasons[i].append(self.reason.format(value=events.statuses[i]))
+        return len(flagged)
+
+
+RULE_TYPES = {rule_type.type: rule_type for rule_type in (PatternRule, MethodRule, LatencyRule, StatusRule)}
+
+
+def _field_text(value) -> str:
+    if not value:
+        return ''
+    values = value.values() if isinstance(value, dict) else (value,)
+    return VALUE_SEPARATOR.join(str(v) for v in values).lower()
+
+
+class RuleEngine:
+    """Evaluates a list of rules over an EventBatch.
+
+    All pattern rules on the same field share one compiled alternation,
+    run once over the whole batch (events joined into a single string);
+    only the events it hits are checked pattern by pattern to build the
+    reasons. Other rules are numpy comparisons over the batch columns.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self._matchers: Dict[str, Any] = {}
+        by_field: Dict[str, List[PatternRule]] = {}
+        for rule in rules:
+            if isinstance(rule, PatternRule):
+                by_field.setdefault(rule.field, []).append(rule)
+        for field, field_rules in by_field.items():
+            patterns = sorted({p for rule in field_rules for p in rule.lowered}, key=len, reverse=True)
+            regex = re.compile('|'.join(re.escape(p) for p in patterns)) if patterns else None
+            self._matchers[field] = (regex, field_rules)
+
+    @classmethod
+    def from_config(cls, config: Optional[List[Dict[str, Any]]] = None) -> 'RuleEngine':
+        rules = []
+        for definition in (DEFAULT_RULES if config is None else config):
+            options = dict(definition)
+            rule_type = options.pop('type', None)
+            if rule_type not in RULE_TYPES:
+                raise ValueError(f"Rule {options.get('name')}: unknown type {rule_type!r}")
+            rules.append(RULE_TYPES[rule_type](**options))
+        return cls(rules)
+
+    def _scan(self, events: EventBatch, field: str, regex) -> tuple:
+        texts = [_field_text(value) for value in getattr(events, PATTERN_FIELDS[field])]
+        if regex is None or not any(texts):
+            return texts, []
+        ends = np.cumsum([len(text) + 1 for text in texts])
+        starts = [match.start() for match in regex.finditer(EVENT_SEPARATOR.join(texts))]
+        return texts, np.unique(np.searchsorted(ends, starts, side='right')).tolist()
+
+    def evaluate(self, events: EventBatch, baseline: Optional[EndpointBaseline] = None) -> List[List[str]]:
+        """Return the rule reasons for each event of the batch (empty list when none match).
+
+        baseline holds the endpoint's latency and status history; without
+        one, latency and status rules fall back to their fixed limits.
+        """
+        reasons: List[List[str]] = [[] for _ in range(len(events))]
+        if not len(events):
+            return reasons
+        context: Dict[str, Any] = {
+            'baseline': baseline if baseline is not None else EndpointBaseline(),
+            'scans': {}
+        }
+        for field, (regex, field_rules) in self._matchers.items():
+            started = time.perf_counter()
+            context['scans'][field] = self._scan(events, field, regex)
+            share = (time.perf_counter() - started) / len(field_rules)
+            for rule in field_rules:
+                rule.seconds += share
+        for rule in self.rules:
+            started = time.perf_counter()
+            hit = rule.evaluate(events, reasons, context)
+            rule.seconds += time.perf_counter() - started
+            rule.events += len(events)
+            rule.hits += hit
+        return reasons
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            rule.name: {'events': rule.events, 'hits': rule.hits, 'seconds': rule.seconds}
+            for rule in self.rules
+        }
+
+    def reset_stats(self):
+        for rule in self.rules:
+            rule.reset_stats()
+
+
+def merge_rule_stats(total: Dict[str, Dict[str, Any]], stats: Dict[str, Dict[str, Any]]):
+    """Add one run's RuleEngine.stats() into a running total."""
+    for name, counters in stats.items():
+        entry = total.setdefault(name, {'events': 0, 'hits': 0, 'seconds': 0.0})
+        for key, value in counters.items():
+            entry[key] += value
@@ -0,0 +1,258 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+import logging
+import numpy as np
+
+from .baselines import EndpointBaseline
+from .batch import EventBatch
+from .canonical import BodyCache
+from .rules import RuleEngine
+from .endpoint_model import EndpointModel
+from .similarity import top_k_neighbors
+from .vectorizer import DEFAULT_HASH_FEATURES, TFIDF, RequestVectorizer
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class AnomalyResult:
+    event_id: int
+    similarity_score: float
+    anomaly_type: str
+    description: str
+    reference_events: List[Dict[str, Any]]
+    path: str = ''  # endpoint (path template) and method, for the anomaly rollups
+    method: str = ''
+
+@dataclass
+class EndpointJob:
+    """Everything needed to score one endpoint, without database access.
+
+    model_state is the persisted model to score against, restricted to
+    reference events that still exist; when None a model is fit over events and
+    only events with an id above watermark are scored. baseline_state is
+    the endpoint's latency/status baseline; events are judged against it as
+    it stood before the batch and folded in afterwards. Events with an id
+    above settled_id are scored but neither folded in nor counted towards
+    last_event_id, since the next run scans them again.
+    """
+    path: str
+    method: str
+    events: EventBatch
+    watermark: Optional[int] = None
+    model_state: Optional[Dict[str, Any]] = None
+    baseline_state: Optional[Dict[str, Any]] = None
+    settled_id: Optional[int] = None
+
+@dataclass
+class EndpointJobResult:
+    path: str
+    method: str
+    anomalies: List[AnomalyResult]
+    last_event_id: Optional[int]
+    model_state: Optional[Dict[str, Any]] = None  # newly fitted model to persist
+    baseline_state: Optional[Dict[str, Any]] = None
+    rule_stats: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+class EndpointScorer:
+    """CPU-bound part of endpoint analysis: vectorize, find neighbours, flag anomalies."""
+
+    def __init__(self, similarity_threshold: float = 0.7, reference_count: int = 3,
+                 reference_sample_size: int = 200, max_features: Optional[int] = 4096,
+                 vectorizer_mode: str = TFIDF, hash_features: int = DEFAULT_HASH_FEATURES,
+                 idf_sample_size: Optional[int] = 5000, body_cache_size: int = 0,
+                 rules: Optional[List[Dict[str, Any]]] = None, baseline_half_life_hours: float = 72):
+        self.similarity_threshold = similarity_threshold
+        self.reference_count = reference_count
+        self.reference_sample_size = reference_sample_size
+        self.max_features = max_features
+        self.vectorizer_mode = vectorizer_mode
+        self.hash_features = hash_features
+        self.idf_sample_size = idf_sample_size
+        self.body_cache_size = body_cache_size
+        # Lives as long as the scorer, so repeated bodies hit across jobs in a worker
+        self.body_cache = BodyCache(body_cache_size) if body_cache_size else None
+        self.rules = rules
+        self.rule_engine = RuleEngine.from_config(rules)
+        self.baseline_half_life_hours = baseline_half_life_hours
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            'similarity_threshold': self.similarity_threshold,
+            'reference_count': self.reference_count,
+            'reference_sample_size': self.reference_sample_size,
+            'max_features': self.max_features,
+            'vectorizer_mode': self.vectorizer_mode,
+            'hash_features': self.hash_features,
+            'idf_sample_size': self.idf_sample_size,
+            'body_cache_size': self.body_cache_size,
+            'rules': self.rules,
+            'baseline_half_life_hours': self.baseline_half_life_hours
+        }
+
+    def make_vectorizer(self) -> RequestVectorizer:
+        return RequestVectorizer(
+            max_features=self.max_features,
+            mode=self.vectorizer_mode,
+            n_features=self.hash_features,
+            idf_sample_size=self.idf_sample_size
+        )
+
+    def run(self, job: EndpointJob) -> EndpointJobResult:
+        self.rule_engine.reset_stats()
+        if job.model_state is not None:
+            result = self._score_with_model(job)
+        else:
+            result = self._fit_and_score(job)
+        for anomaly in result.anomalies:
+            anomaly.path, anomaly.method = job.path, job.method
+        result.rule_stats = self.rule_engine.stats()
+        return result
+
+    def _fit_and_score(self, job: EndpointJob) -> EndpointJobResult:
+        """Fit a vectorizer over the window and score the events after the watermark.
+
+        New events are compared with the whole window, so already-analysed
+        events still serve as references.
+        """
+        window = job.events
+        vectorizer = self.make_vectorizer()
+        texts = vectorizer.to_strings(window.request_data(), self.body_cache)
+        logger.debug("Vectorizing %d requests", len(texts))
+        vectors = vectorizer.fit_transform_strings(texts)
+        logger.debug("Vector shape: %s", vectors.shape)
+
+        baseline = EndpointBaseline.from_dict(job.baseline_state)
+        cold_start = baseline.updated_at is None
+        if cold_start:
+            # Nothing to judge against yet, so the whole window seeds the baseline
+            self._update_baseline(baseline, self._settled(job, window))
+        if job.watermark is None:
+            events = window
+            anomalies = self._find_anomalies(vectors, window, baseline)
+        else:
+            new_rows = [i for i, event_id in enumerate(window.ids) if event_id > job.watermark]
+            events = window.take(new_rows)
+            anomalies = self._find_anomalies(vectors[new_rows], events, baseline, vectors, window.ids) if new_rows else []
+        settled = self._settled(job, events)
+        if not cold_start:
+            self._update_baseline(baseline, settled)
+
+        model_state = None
+        if vectorizer.fitted:
+            model = EndpointModel.fit(
+                job.path, job.method, vectorizer,
+                event_ids=window.ids.tolist(),
+                texts=texts,
+                sample_size=self.reference_sample_size,
+                exclude_ids={anomaly.event_id for anomaly in anomalies}
+            )
+            model_state = model.to_dict()
+        return EndpointJobResult(
+            path=job.path,
+            method=job.method,
+            anomalies=anomalies,
+            last_event_id=int(settled.ids.max()) if len(settled) else None,
+            model_state=model_state,
+            baseline_state=baseline.to_dict()
+        )
+
+    def _score_with_model(self, job: EndpointJob) -> EndpointJobResult:
+        """Score events against a persisted model's reference sample."""
+        model = EndpointModel.from_dict(job.path, job.method, job.model_state)
+        vectors = model.vectorizer.transform_strings(
+            model.vectorizer.to_strings(job.events.request_data(), self.body_cache)
+        )
+        reference_vectors = model.vectorizer.transform_strings(model.reference_texts)
+        baseline = EndpointBaseline.from_dict(job.baseline_state)
+        settled = self._settled(job, job.events)
+        cold_start = baseline.updated_at is None
+        if cold_start:
+            self._update_baseline(baseline, settled)
+        logger.debug("Scoring %d events against %d reference events", vectors.shape[0], len(model.reference_ids))
+        anomalies = self._find_anomalies(vectors, job.events, baseline, reference_vectors,
+                                         np.asarray(model.reference_ids, dtype=np.int64))
+        if not cold_start:
+            self._update_baseline(baseline, settled)
+        return EndpointJobResult(
+            path=job.path,
+            method=job.method,
+            anomalies=anomalies,
+            last_event_id=int(settled.ids.max()) if len(settled) else None,
+            baseline_state=baseline.to_dict()
+        )
+
+    @staticmethod
+    def _settled(job: EndpointJob, events: EventBatch) -> EventBatch:
+        if job.settled_id is None:
+            return events
+        return events.take(np.flatnonzero(events.ids <= job.settled_id).tolist())
+
+    def _update_baseline(self, baseline: EndpointBaseline, events: EventBatch):
+        if len(events):
+            baseline.update(events.durations, events.status_codes, half_life_hours=self.baseline_half_life_hours)
+
+    def _find_anomalies(self, vectors, events: EventBatch, baseline: EndpointBaseline, reference_vectors=None,
+                        reference_ids: Optional[np.ndarray] = None) -> List[AnomalyResult]:
+        """Find anomalies in the vectorized requests.
+
+        Without references each request is compared with the other requests
+        in the batch; otherwise with reference_vectors, whose event ids are
+        reference_ids (a persisted model's reference sample or the window).
+        Latency and status rules are judged against the endpoint baseline,
+        which the caller has not yet updated with events (except on a cold start).
+        """
+        logger.debug("Calculating top-%d neighbours for %d vectors", self.reference_count, vectors.shape[0])
+        if reference_vectors is None:
+            reference_ids = events.ids
+            neighbor_indices, neighbor_similarities = top_k_neighbors(vectors, k=self.reference_count)
+        else:
+            neighbor_indices, neighbor_similarities = top_k_neighbors(
+                vectors, k=self.reference_count,
+                references=reference_vectors,
+                query_ids=events.ids,
+                reference_ids=reference_ids
+            )
+        rule_reasons = self.rule_engine.evaluate(events, baseline)
+        anomalies = []
+
+        logger.info("Starting anomaly detection for %d events", len(events))
+
+        for i, event_id in enumerate(events.ids.tolist()):
+            anomaly_reasons = rule_reasons[i]
+
+            # Check request similarity against the nearest other request
+            max_similarity = float(neighbor_similarities[i][0])
+            if max_similarity < self.similarity_threshold:
+                anomaly_reasons.append(f"Unusual request pattern (similarity: {max_similarity:.2f})")
+
+            if anomaly_reasons:
+                # Only ids and similarities are stored; readers hydrate the events when needed
+                reference_events = [
+                    {'id': int(reference_ids[idx]), 'similarity': float(similarity)}
+                    for idx, similarity in zip(neighbor_indices[i], neighbor_similarities[i])
+                ]
+
+                anomaly = AnomalyResult(
+                    event_id=event_id,
+                    similarity_score=max_similarity,
+                    anomaly_type='request_pattern_anomaly',
+                    description='; '.join(anomaly_reasons),
+                    reference_events=reference_events
+                )
+                logger.debug("Created anomaly result for event %d: %s", event_id, anomaly.description)
+                anomalies.append(anomaly)
+
+        logger.info("Anomaly detection complete. Found %d anomalies in %d events", 
+                    len(anomalies), len(events))
+        return anomalies
+
+
+_worker_scorer: Optional[EndpointScorer] = None
+
+
+def score_endpoint_job(job: EndpointJob, settings: Dict[str, Any]) -> EndpointJobResult:
+    """Process pool entry point; the scorer (and its body cache) is reused within a worker."""
+    global _worker_scorer
+    if _worker_scorer is None or _worker_scorer.settings() != settings:
+        _worker_scorer = EndpointScorer(**settings)
+    return _worker_scorer.run(job)
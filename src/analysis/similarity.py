@@ -1,8 +1,76 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any, Tuple
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from .vectorizer import RequestVectorizer
 
+# Upper bound for the similarity block materialized at once
+DEFAULT_MAX_BLOCK_BYTES = 64 * 1024 * 1024
+# A block entry costs ~12 bytes in the sparse product plus 8 once densified
+BLOCK_BYTES_PER_ENTRY = 24
+
+
+def top_k_neighbors(
+    vectors,
+    k: int = 3,
+    max_block_bytes: int = DEFAULT_MAX_BLOCK_BYTES,
+    references=None,
+    query_ids: Optional[Sequence[int]] = None,
+    reference_ids: Optional[Sequence[int]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine top-k nearest neighbours of every row, excluding the row itself.
+
+    Rows are compared in blocks via sparse matrix products, so peak memory is
+    bounded by max_block_bytes instead of growing with N^2. When references
+    is given, rows are compared against its rows instead of each other, and
+    a reference whose id equals the query's id is excluded.
+    Returns: (indices, similarities), both of shape (N, min(k, candidates)),
+    ordered from most to least similar.
+    """
+    X = normalize(sparse.csr_matrix(vectors, dtype=np.float64), norm='l2', copy=False)
+    if references is None:
+        R = X
+        candidates = X.shape[0] - 1
+    else:
+        R = normalize(sparse.csr_matrix(references, dtype=np.float64), norm='l2', copy=False)
+        candidates = R.shape[0]
+    n, m = X.shape[0], R.shape[0]
+    k = max(min(k, candidates), 0)
+    indices = np.zeros((n, k), dtype=np.int64)
+    similarities = np.zeros((n, k), dtype=np.float64)
+    if k == 0:
+        return indices, similarities
+
+    reference_columns = None
+    if references is not None and query_ids is not None and reference_ids is not None:
+        reference_columns = {int(ref_id): col for col, ref_id in enumerate(reference_ids)}
+
+    RT = R.T.tocsc()
+    block_size = max(1, int(max_block_bytes // (BLOCK_BYTES_PER_ENTRY * m)))
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        block = (X[start:end] @ RT).toarray()
+        if references is None:
+            rows = np.arange(end - start)
+            block[rows, rows + start] = -np.inf  # exclude self-similarity
+        elif reference_columns is not None:
+            for row in range(end - start):
+                col = reference_columns.get(int(query_ids[start + row]))
+                if col is not None:
+                    block[row, col] = -np.inf
+
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_sims = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        indices[start:end] = np.take_along_axis(top, order, axis=1)
+        similarities[start:end] = np.take_along_axis(top_sims, order, axis=1)
+
+    # Only possible when a query was excluded from a reference set of size k
+    np.maximum(similarities, 0.0, out=similarities)
+    return indices, similarities
+
+
 class SimilarityAnalyzer:
     def __init__(self, similarity_threshold: float = 0.8):
         self.vectorizer = RequestVectorizer()
@@ -23,24 +91,18 @@ class SimilarityAnalyzer:
             # Convert requests to vectors
             vectors = self.vectorizer.fit_transform(requests)
             
-            # Calculate pairwise similarities
-            similarities = cosine_similarity(vectors)
+            # Top-3 neighbours per request (self-similarity excluded)
+            neighbor_indices, neighbor_similarities = top_k_neighbors(vectors, k=3)
             
             anomalies = []
             for i in range(len(requests)):
-                # Get similarities for this request (excluding self-similarity)
-                request_similarities = similarities[i].copy()  # Make a copy to modify
-                request_similarities[i] = 0  # Exclude self-similarity
+                similar_count = int(np.sum(neighbor_similarities[i] > self.similarity_threshold))
                 
-                # Find most similar requests
-                similar_indices = np.where(request_similarities > self.similarity_threshold)[0]
-                
-                if len(similar_indices) < 3:  # Consider as anomaly if less than 3 similar requests
-                    max_similarity = float(np.max(request_similarities))  # Convert to Python float
-                    similar_indices = np.argsort(request_similarities)[-3:]  # Get top 3 similar
-                    anomalies.append((i, max_similarity, similar_indices.tolist()))
+                if similar_count < 3:  # Consider as anomaly if less than 3 similar requests
+                    max_similarity = float(neighbor_similarities[i][0])  # Convert to Python float
+                    anomalies.append((i, max_similarity, neighbor_indices[i].tolist()))
             
             return anomalies
         except Exception as e:
             print(f"Error in find_anomalies: {str(e)}")
-            return []
\ No newline at end of file
+            return []
@@ -1,100 +1,167 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-import json
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
 import logging
+from .canonical import BodyCache, request_to_string
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+TFIDF = 'tfidf'
+HASHING = 'hashing'
+DEFAULT_HASH_FEATURES = 2 ** 18
+
 class RequestVectorizer:
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
+    """Character 3-5 gram vectors of requests.
+
+    In 'tfidf' mode the vocabulary is learned at fit time. In 'hashing'
+    mode n-grams are hashed into a fixed n_features space, so there is no
+    vocabulary to fit or persist; only the optional IDF weights (learned
+    from at most idf_sample_size requests) are state. Without IDF the
+    hashing vectorizer needs no fitting at all.
+    """
+
+    def __init__(self, max_features: Optional[int] = None, mode: str = TFIDF,
+                 n_features: int = DEFAULT_HASH_FEATURES, use_idf: bool = True,
+                 idf_sample_size: Optional[int] = None):
+        if mode not in (TFIDF, HASHING):
+            raise ValueError(f"Unknown vectorizer mode: {mode}")
+        self.max_features = max_features
+        self.mode = mode
+        self.n_features = n_features
+        self.use_idf = use_idf
+        self.idf_sample_size = idf_sample_size
+        self.idf = None
+        if mode == TFIDF:
+            self.vectorizer = TfidfVectorizer(
+                analyzer='char',
+                ngram_range=(3, 5),
+                lowercase=True,
+                max_features=max_features
+            )
+            self.fitted = False
+        else:
+            self.vectorizer = HashingVectorizer(
+                analyzer='char',
+                ngram_range=(3, 5),
+                lowercase=True,
+                n_features=n_features,
+                alternate_sign=False,
+                norm=None if use_idf else 'l2'
+            )
+            if use_idf:
+                self.idf = TfidfTransformer()
+            self.fitted = not use_idf
+        logger.info("RequestVectorizer initialized (mode=%s)", mode)
+
+    def get_state(self) -> Dict[str, Any]:
+        """JSON-serializable fitted state.
+
+        tfidf: vocabulary in index order and IDF weights. hashing: the
+        feature space plus, with IDF, the weights of the hashed features
+        seen at fit time (all others share idf_default).
+        """
+        if not self.fitted:
+            raise ValueError("RequestVectorizer is not fitted")
+        if self.mode == HASHING:
+            state = {'mode': HASHING, 'n_features': self.n_features, 'use_idf': self.use_idf}
+            if self.use_idf:
+                idf = self.idf.idf_
+                default = float(idf.max())
+                seen = np.flatnonzero(idf < default)
+                state.update({
+                    'idf_indices': seen.tolist(),
+                    'idf_values': [round(float(w), 6) for w in idf[seen]],
+                    'idf_default': round(default, 6)
+                })
+            return state
+        vocabulary = self.vectorizer.vocabulary_
+        terms = [None] * len(vocabulary)
+        for term, index in vocabulary.items():
+            terms[index] = term
+        return {
+            'mode': TFIDF,
+            'terms': terms,
+            'idf': [round(float(w), 6) for w in self.vectorizer.idf_]
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> 'RequestVectorizer':
+        """Rebuild a fitted vectorizer from get_state() output without refitting."""
+        if state.get('mode', TFIDF) == HASHING:
+            instance = cls(mode=HASHING, n_features=state['n_features'], use_idf=state['use_idf'])
+            if instance.use_idf:
+                idf = np.full(instance.n_features, state['idf_default'], dtype=np.float64)
+                idf[np.asarray(state['idf_indices'], dtype=np.int64)] = state['idf_values']
+                instance.idf.idf_ = idf
+                instance.fitted = True
+            return instance
+
+        instance = cls()
+        instance.vectorizer = TfidfVectorizer(
             analyzer='char',
             ngram_range=(3, 5),
-            lowercase=True
+            lowercase=True,
+            vocabulary={term: index for index, term in enumerate(state['terms'])}
         )
-        self.fitted = False
-        logger.info("RequestVectorizer initialized")
+        instance.vectorizer.idf_ = np.asarray(state['idf'], dtype=np.float64)
+        instance.fitted = True
+        return instance
 
-    def _flatten_json(self, data: Any, prefix: str = '') -> Dict[str, str]:
-        """Flatten nested JSON into key-value pairs."""
-        items: List = []
-        
-        if data is None:
-            logger.debug("Received None data to flatten")
-            return {}
-            
-        if not isinstance(data, dict):
-            try:
-                result = {prefix: str(data)} if prefix else {'value': str(data)}
-                logger.debug("Flattened non-dict data: %s", result)
-                return result
-            except:
-                logger.warning("Failed to convert data to string", exc_info=True)
-                return {}
+    def to_strings(self, requests: List[Dict[str, Any]], body_cache: Optional[BodyCache] = None) -> List[str]:
+        """Canonical request strings; body_cache reuses the parts of repeated bodies."""
+        return [request_to_string(req, body_cache) for req in requests]
 
-        for k, v in data.items():
-            new_key = f"{prefix}.{k}" if prefix else k
-            if isinstance(v, dict):
-                items.extend(self._flatten_json(v, new_key).items())
-            elif isinstance(v, list):
-                for i, item in enumerate(v):
-                    if isinstance(item, dict):
-                        items.extend(self._flatten_json(item, f"{new_key}.{i}").items())
-                    else:
-                        items.append((f"{new_key}.{i}", str(item)))
-            else:
-                items.append((new_key, str(v)))
-        return dict(items)
+    def transform_strings(self, string_requests: List[str]) -> sparse.csr_matrix:
+        """Vectorize request strings with the already fitted vocabulary."""
+        if not self.fitted:
+            raise ValueError("RequestVectorizer is not fitted")
+        vectors = self.vectorizer.transform(string_requests)
+        if self.idf is not None:
+            vectors = self.idf.transform(vectors)
+        return vectors
 
-    def _request_to_string(self, request_data: Dict[str, Any]) -> str:
-        """Convert entire request data to a string representation."""
-        logger.debug("Converting request to string representation")
-        parts = []
-        
-        # Add path and method
-        path = request_data.get('path', '')
-        method = request_data.get('method', '')
-        parts.append(f"path:{path}")
-        parts.append(f"method:{method}")
-        
-        # Process request body
-        body_flat = self._flatten_json(request_data.get('body', {}))
-        parts.extend(f"body.{k}:{v}" for k, v in body_flat.items())
-        
-        # Process query parameters
-        query_flat = self._flatten_json(request_data.get('query_params', {}))
-        parts.extend(f"query.{k}:{v}" for k, v in query_flat.items())
-        
-        # Process headers
-        headers = request_data.get('headers', {})
-        for header, value in headers.items():
-            parts.append(f"header.{header}:{value}")
-        
-        result = ' '.join(sorted(parts))
-        logger.debug("Request string length: %d", len(result))
-        return result
+    def transform(self, requests: List[Dict[str, Any]]) -> sparse.csr_matrix:
+        """Vectorize requests with the already fitted vocabulary."""
+        return self.transform_strings(self.to_strings(requests))
 
-    def fit_transform(self, requests: List[Dict[str, Any]]) -> np.ndarray:
-        """Convert a list of requests into vectors."""
+    def fit_transform(self, requests: List[Dict[str, Any]]) -> sparse.csr_matrix:
+        """Convert a list of requests into sparse, L2-normalized vectors."""
+        return self.fit_transform_strings(self.to_strings(requests))
+
+    def _fit_hashing(self, string_requests: List[str]) -> sparse.csr_matrix:
+        counts = self.vectorizer.transform(string_requests)
+        if self.idf is None:
+            return counts
+        sample = counts
+        if self.idf_sample_size and counts.shape[0] > self.idf_sample_size:
+            rows = np.random.default_rng(0).choice(counts.shape[0], self.idf_sample_size, replace=False)
+            sample = counts[np.sort(rows)]
+        self.idf.fit(sample)
+        return self.idf.transform(counts)
+
+    def fit_transform_strings(self, string_requests: List[str]) -> sparse.csr_matrix:
+        """Fit the vocabulary on request strings and return their vectors."""
         try:
-            logger.info("Vectorizing %d requests", len(requests))
-            string_requests = [self._request_to_string(req) for req in requests]
+            logger.info("Vectorizing %d requests", len(string_requests))
             
             if all(not s for s in string_requests):
                 logger.warning("All requests produced empty strings")
-                return np.zeros((len(requests), 1))
+                return sparse.csr_matrix((len(string_requests), 1))
                 
             logger.debug("Average request string length: %.2f", 
                         sum(len(s) for s in string_requests) / len(string_requests))
             
-            vectors = self.vectorizer.fit_transform(string_requests)
+            if self.mode == HASHING:
+                vectors = self._fit_hashing(string_requests)
+            else:
+                vectors = self.vectorizer.fit_transform(string_requests)
             self.fitted = True
             
             logger.info("Vectorization complete. Shape: %s", vectors.shape)
-            return vectors.toarray()
+            return vectors
             
         except Exception as e:
             logger.error("Error in fit_transform: %s", str(e), exc_info=True)
-            return np.zeros((len(requests), 1))
\ No newline at end of file
+            return sparse.csr_matrix((len(string_requests), 1))
\ No newline at end of file
@@ -1,15 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from datetime import datetime, timedelta
 from .config import Config
-from .storage.mysql import MySQLStorage
+from .storage.mysql import MySQLStorage, parse_anomaly_fields, decode_anomaly_cursor
 from .services.traffic import TrafficService
+from .services.path_templates import seeded_templater
+from .services.ingest_buffer import IngestBuffer, BufferFullError, BatchTooLargeError
+from .services.ndjson import open_decoded, iter_lines, ingest_lines, UnsupportedEncodingError
 from .analysis.analyzer import RequestAnalyzer
+from .analysis.rules import RuleEngine, load_rules
 from .generation.test_utils import TestGenerator
+from .generation.rate_limit import RateLimiter
+from .generation.cache import GenerationCache
 from .background_worker import BackgroundWorker
 from .models import Job
+import json
 import logging
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import atexit
 import uuid
 
 executor = ThreadPoolExecutor(max_workers=5)
@@ -27,49 +35,185 @@ def create_app():
     config = Config()
     job_registry = {}
     
-    storage = MySQLStorage(config.MYSQL_URI)
-    traffic_service = TrafficService(storage)
+    storage = MySQLStorage(config.MYSQL_URI, insert_chunk_size=config.INGEST_CHUNK_SIZE)
+    templater = seeded_templater(storage, learn_threshold=config.PATH_TEMPLATE_LEARN_THRESHOLD)
+    traffic_service = TrafficService(storage, bulk_insert=config.INGEST_BULK_INSERT, templater=templater)
+
+    ingest_buffer = None
+    if config.INGEST_BUFFER_ENABLED:
+        ingest_buffer = IngestBuffer(
+            traffic_service.store_events,
+            max_events=config.INGEST_BUFFER_MAX_EVENTS,
+            max_batch_size=config.INGEST_BUFFER_BATCH_SIZE,
+            max_batch_age=config.INGEST_BUFFER_MAX_AGE_MS / 1000.0
+        ).start()
+        # Gunicorn workers exit through sys.exit on recycle/shutdown, so queued
+        # events are flushed before the process goes away.
+        atexit.register(ingest_buffer.close, config.INGEST_BUFFER_DRAIN_TIMEOUT)
+
+    analysis_rules = None
+    if config.ANALYSIS_RULES_FILE:
+        analysis_rules = load_rules(config.ANALYSIS_RULES_FILE)
+        RuleEngine.from_config(analysis_rules)  # fail at startup on an invalid rules file
+
+    def make_analyzer():
+        return RequestAnalyzer(
+            storage,
+            model_max_age_hours=config.ANALYSIS_MODEL_MAX_AGE_HOURS,
+            reference_sample_size=config.ANALYSIS_REFERENCE_SAMPLE_SIZE,
+            max_features=config.ANALYSIS_MAX_FEATURES,
+            workers=config.ANALYSIS_WORKERS,
+            fetch_chunk_size=config.ANALYSIS_FETCH_CHUNK_SIZE,
+            window_sample_size=config.ANALYSIS_WINDOW_SAMPLE_SIZE,
+            vectorizer_mode=config.ANALYSIS_VECTORIZER_MODE,
+            hash_features=config.ANALYSIS_HASH_FEATURES,
+            body_cache_size=config.ANALYSIS_BODY_CACHE_SIZE,
+            rules=analysis_rules,
+            baseline_half_life_hours=config.ANALYSIS_BASELINE_HALF_LIFE_HOURS,
+            watermark_lag_seconds=config.ANALYSIS_WATERMARK_LAG_SECONDS
+        )
 
     @app.route('/api/v1/events', methods=['POST'])
     def collect_events():
         try:
             events = request.json.get('events', [])
+            if ingest_buffer is not None:
+                ingest_buffer.submit(events)
+                return jsonify({
+                    'status': 'accepted',
+                    'message': f'Queued {len(events)} events'
+                }), 202
             traffic_service.store_events(events)
             return jsonify({
                 'status': 'success',
                 'message': f'Stored {len(events)} events'
             })
+        except BatchTooLargeError as e:
+            logger.warning(f"Rejecting events: {str(e)}")
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 413
+        except BufferFullError as e:
+            logger.warning(f"Rejecting events: {str(e)}")
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 429, {'Retry-After': '1'}
         except Exception as e:
             return jsonify({
                 'status': 'error',
                 'message': str(e)
             }), 500
 
+    @app.route('/api/v1/events/stream', methods=['POST'])
+    def collect_events_stream():
+        """Ingest newline-delimited JSON events without buffering the whole body."""
+        try:
+            stream = open_decoded(request.stream, request.headers.get('Content-Encoding'))
+            report = ingest_lines(
+                iter_lines(stream),
+                traffic_service.store_events,
+                chunk_size=config.INGEST_CHUNK_SIZE
+            )
+            return jsonify({
+                'status': 'success' if not report['rejected'] else 'partial',
+                'message': f"Stored {report['stored']} events, rejected {report['rejected']}",
+                **report
+            })
+        except UnsupportedEncodingError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 415
+        except (OSError, EOFError) as e:
+            logger.error(f"Error decoding event stream: {str(e)}")
+            return jsonify({
+                'status': 'error',
+                'message': f'Could not decode request body: {str(e)}'
+            }), 400
+        except Exception as e:
+            logger.error(f"Error ingesting event stream: {str(e)}")
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
 
-    
     @app.route('/api/v1/analysis/anomalies', methods=['GET'])
     async def get_anomalies():
+        """Anomalies newest first, one keyset page at a time or streamed as NDJSON."""
         hours = request.args.get('hours', default=24, type=int)
         min_score = request.args.get('min_score', default=0.0, type=float)
-        
-        anomalies = await storage.get_anomalies(hours=hours, min_score=min_score)
+        hydrate = request.args.get('hydrate_references', default='true').lower() not in ('0', 'false', 'no')
+        cursor = request.args.get('cursor') or None
+        fields = request.args.get('fields')
+        fields = [field for field in fields.split(',') if field.strip()] if fields else None
+        stream = (request.args.get('format') == 'ndjson'
+                  or request.accept_mimetypes.best == 'application/x-ndjson')
+        limit = request.args.get('limit', default=None if stream else config.ANOMALIES_PAGE_SIZE, type=int)
+        try:
+            parse_anomaly_fields(fields)
+            if cursor:
+                decode_anomaly_cursor(cursor)
+            if limit is not None and (limit < 1 or (not stream and limit > config.ANOMALIES_MAX_PAGE_SIZE)):
+                raise ValueError(f"limit must be between 1 and {config.ANOMALIES_MAX_PAGE_SIZE}")
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        pages = storage.iter_anomalies(
+            hours=hours, min_score=min_score, hydrate_references=hydrate, fields=fields, cursor=cursor,
+            limit=limit, page_size=min(limit or config.ANOMALIES_PAGE_SIZE, config.ANOMALIES_MAX_PAGE_SIZE)
+        )
+        if stream:
+            def generate():
+                # Rows are written as each page is fetched. Arguments are bound above:
+                # async views cannot use stream_with_context
+                for page, _ in pages:
+                    for row in page:
+                        yield json.dumps(row, separators=(',', ':')) + '\n'
+            return Response(generate(), mimetype='application/x-ndjson')
+
+        anomalies, next_cursor = next(pages, ([], None))
         return jsonify({
             'anomalies': anomalies,
-            'count': len(anomalies)
+            'count': len(anomalies),
+            'next_cursor': next_cursor
         })
-    
-
 
+    @app.route('/api/v1/analysis/anomalies/summary', methods=['GET'])
+    async def get_anomaly_summary():
+        """Grouped anomaly counts, score histogram and top endpoints from the hourly rollups."""
+        hours = request.args.get('hours', default=24, type=int)
+        top = request.args.get('top', default=10, type=int)
+        group_by = request.args.get('group_by', default='hour,endpoint,anomaly_type')
+        try:
+            summary = await storage.get_anomaly_summary(
+                hours=hours,
+                group_by=[group.strip() for group in group_by.split(',') if group.strip()],
+                top=top,
+                path=request.args.get('path'),
+                method=request.args.get('method')
+            )
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+        return jsonify(summary)
 
     @app.route('/api/v1/analysis/analyze', methods=['POST'])
     async def analyze_traffic():
         try:
             hours = request.json.get('hours', 24)
-            analyzer = RequestAnalyzer(storage)
+            analyzer = make_analyzer()
             await analyzer.analyze_recent_traffic(hours)
             return jsonify({
                 'status': 'success',
-                'message': f'Analyzed traffic for past {hours} hours'
+                'message': f'Analyzed traffic for past {hours} hours',
+                'rule_stats': analyzer.rule_stats
             })
         except Exception as e:
             return jsonify({
@@ -91,9 +235,26 @@ def create_app():
             # Define the background task
             def run_analysis_job(job_id, hours):
                 try:
-                    analyzer = RequestAnalyzer(storage)
-                    analyzer.analyze_recent_traffic(hours)
-                    worker = BackgroundWorker(storage, TestGenerator())
+                    analyzer = make_analyzer()
+                    asyncio.run(analyzer.analyze_recent_traffic(hours))
+                    rate_limiter = RateLimiter(
+                        requests_per_minute=config.GENERATION_REQUESTS_PER_MINUTE,
+                        tokens_per_minute=config.GENERATION_TOKENS_PER_MINUTE
+                    )
+                    cache = GenerationCache(
+                        storage,
+                        ttl_hours=config.GENERATION_CACHE_TTL_HOURS,
+                        max_entries=config.GENERATION_CACHE_MAX_ENTRIES
+                    ) if config.GENERATION_CACHE_ENABLED else None
+                    worker = BackgroundWorker(
+                        storage,
+                        TestGenerator(
+                            rate_limiter=rate_limiter,
+                            cache=cache,
+                            max_batch_size=config.GENERATION_BATCH_SIZE
+                        ),
+                        concurrency=config.GENERATION_CONCURRENCY
+                    )
                     results = asyncio.run(worker.run_analysis(hours=hours))
                     logger.info(f"Analysis job {job_id} completed: {results}")
                     job_registry[job_id] = {'status': 'completed', 'result': results}
@@ -1,88 +1,159 @@
 # background_worker.py
 from datetime import datetime, timedelta
+import asyncio
 import logging
-from typing import Dict
+import time
+from typing import Dict, List, Tuple
 from .models import Job, EndpointTestCase
 from .analysis.analyzer import RequestAnalyzer
-import json
 
 logger = logging.getLogger(__name__)
 
 class BackgroundWorker:
-    def __init__(self, storage, test_generator):
+    def __init__(self, storage, test_generator, concurrency: int = 8):
         self.storage = storage
         self.test_generator = test_generator
-        logger.info("Initialized Worker")
+        self.concurrency = max(1, concurrency)
+        logger.info(f"Initialized Worker (generation concurrency: {self.concurrency})")
 
     async def run_analysis(self, hours: int) -> Dict:
         """Run analysis and return results directly"""
         logger.info(f"Starting analysis for past {hours} hours")
-        session = self.storage.Session()
-        processed_count = 0
-        
+
         try:
             logger.debug(f"Fetching anomalies for past {hours} hours")
             anomalies = await self.storage.get_anomalies_by_endpoint(hours=hours)
             logger.info(f"Found {len(anomalies)} anomalies to analyze")
 
-            for anomaly in anomalies:
-                if anomaly.reference_events:
-                    logger.debug(f"Processing anomaly ID: {anomaly.id} with {len(anomaly.reference_events)} reference events")
-                    
-                    for ref_event in anomaly.reference_events:
-                        url = ref_event.get("path")
-                        http_method = ref_event.get("method")
-                        
-                        endpoint_data = {
-                            "url": url,
-                            "http_method": http_method,
+            # Reference events are stored by id; load all of them in one query
+            references = await self.storage.hydrate_references([anomaly.reference_events for anomaly in anomalies])
+
+            items: List[Tuple[int, Dict]] = []
+            for anomaly, reference_events in zip(anomalies, references):
+                if reference_events:
+                    logger.debug(f"Processing anomaly ID: {anomaly.id} with {len(reference_events)} reference events")
+
+                    for ref_event in reference_events:
+                        if ref_event.get("path") is None:
+                            logger.debug(f"Skipping missing reference event {ref_event.get('id')} for anomaly {anomaly.id}")
+                            continue
+                        items.append((anomaly.id, {
+                            "url": ref_event.get("path"),
+                            # References stored inline before ids carry no template
+                            "path_template": ref_event.get("path_template") or ref_event.get("path"),
+                            "http_method": ref_event.get("method"),
                             "request_body": ref_event.get("request_body"),
                             "status": ref_event.get("status"),
                             "timestamp": ref_event.get("timestamp")
-                        }
-                        
-                        try:
-                            async for test_case_chunk in self.test_generator.generate_streaming(endpoint_data):
-                                if test_case_chunk != "[DONE]":
-                                    try:
-                                        test_case_raw = json.loads(test_case_chunk)
-                                        
-                                        # Format the test case according to the specified structure
-                                        formatted_test_case = {
-                                            "description": test_case_raw.get("description", "Generated test case"),
-                                            "category": test_case_raw.get("category", "functional"),
-                                            "priority": test_case_raw.get("priority", "medium"),
-                                            "request": {
-                                                "method": http_method,
-                                                "url": url,
-                                                "headers": test_case_raw.get("headers", {}),
-                                                "path_params": test_case_raw.get("path_params", {}),
-                                                "query_params": test_case_raw.get("query_params", {}),
-                                                "body": test_case_raw.get("body", {})
-                                            }
-                                        }
-
-                                        # Store the test case immediately
-                                        await self.storage.store_test_case(
-                                            url=url,
-                                            http_method=http_method,
-                                            test_case=formatted_test_case
-                                        )
-                                        processed_count += 1
-
-                                    except json.JSONDecodeError as e:
-                                        logger.warning(f"Failed to parse test case chunk for anomaly {anomaly.id}: {e}")
-                        except Exception as e:
-                            logger.error(f"Error generating test cases for anomaly {anomaly.id}: {e}")
-                            continue
-                    
+                        }))
+
+            unique_items = self.deduplicate(items)
+            stats = await self.generate_test_cases(unique_items)
+
+            cache = self.test_generator.cache
+            if cache is not None:
+                try:
+                    await cache.evict()
+                except Exception as e:
+                    logger.warning(f"Generation cache eviction failed: {str(e)}")
+
         except Exception as e:
             logger.error(f"Error in analysis: {str(e)}", exc_info=True)
             raise
         finally:
-            session.close()
-            
-        return {
-            'total_test_cases_generated': processed_count,
+            await self.test_generator.aclose()
+
+        result = {
+            'total_test_cases_generated': stats['test_cases'],
+            'reference_events': len(items),
+            'deduplicated_reference_events': len(items) - len(unique_items),
+            'failed_reference_events': stats['failed'],
+            'prompts': stats['batches'],
             'status': 'completed'
-        }
\ No newline at end of file
+        }
+        if cache is not None:
+            result['cache'] = cache.stats()
+        return result
+
+    def deduplicate(self, items: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        """Keep the first item per request fingerprint, so each distinct request is generated once."""
+        seen = set()
+        unique = []
+        for anomaly_id, endpoint_data in items:
+            key = self.test_generator.fingerprint(endpoint_data)
+            if key not in seen:
+                seen.add(key)
+                unique.append((anomaly_id, endpoint_data))
+        if len(unique) < len(items):
+            logger.info(f"Deduplicated {len(items) - len(unique)} of {len(items)} reference events")
+        return unique
+
+    async def generate_test_cases(self, items: List[Tuple[int, Dict]]) -> Dict:
+        """Generate and store test cases for (anomaly_id, endpoint_data) items concurrently.
+
+        Items of the same endpoint are packed into shared prompts by the
+        generator's plan_batches. At most `concurrency` LLM calls are in
+        flight (the generator's rate limiter may hold them back further);
+        each test case is stored as soon as its response is parsed. A failed
+        batch is logged and its items counted as failed.
+        """
+        batches = self.test_generator.plan_batches(items)
+        in_flight = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+
+        async def run(batch: List[Tuple[int, Dict]]) -> int:
+            async with in_flight:
+                try:
+                    return await self._generate_for_batch(batch)
+                except Exception as e:
+                    anomaly_ids = sorted({anomaly_id for anomaly_id, _ in batch})
+                    logger.error(f"Error generating test cases for anomalies {anomaly_ids}: {e}")
+                    return -1
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        stats = {
+            'items': len(items),
+            'batches': len(batches),
+            'test_cases': sum(count for count in results if count > 0),
+            'failed': sum(len(batch) for batch, count in zip(batches, results) if count < 0),
+            'seconds': time.perf_counter() - started
+        }
+        logger.info(f"Generated {stats['test_cases']} test cases for {stats['items']} reference events "
+                    f"in {stats['batches']} prompts ({stats['failed']} failed) in {stats['seconds']:.1f}s")
+        return stats
+
+    async def _generate_for_batch(self, batch: List[Tuple[int, Dict]]) -> int:
+        samples = [endpoint_data for _, endpoint_data in batch]
+        stored = 0
+        async for position, test_case_raw in self.test_generator.generate_batch_streaming(samples):
+            endpoint_data = samples[position]
+            url = endpoint_data["url"]
+            http_method = endpoint_data["http_method"]
+            # The prompt asks for the request fields nested under "request"; older responses had them at the top
+            request = test_case_raw.get("request")
+            if not isinstance(request, dict):
+                request = test_case_raw
+
+            # Format the test case according to the specified structure
+            formatted_test_case = {
+                "description": test_case_raw.get("description", "Generated test case"),
+                "category": test_case_raw.get("category", "functional"),
+                "priority": test_case_raw.get("priority", "medium"),
+                "request": {
+                    "method": http_method,
+                    "url": url,
+                    "headers": request.get("headers", {}),
+                    "path_params": request.get("path_params", {}),
+                    "query_params": request.get("query_params", {}),
+                    "body": request.get("body", {})
+                }
+            }
+
+            # Store the test case immediately
+            await self.storage.store_test_case(
+                url=url,
+                http_method=http_method,
+                test_case=formatted_test_case
+            )
+            stored += 1
+        return stored
@@ -0,0 +1,241 @@
+"""Bulk load JSONL traffic captures into traffic_events.
+
+Usage:
+    python -m src.cli.load_events captures/*.jsonl.gz --workers 4 --checkpoint load.ckpt
+
+Files may be plain, gzip (.gz) or zstd (.zst) compressed JSONL with one
+event per line. Progress is checkpointed per file as the last line number
+whose chunk (and every chunk before it) has been committed, plus the line
+ranges of chunks committed past a chunk that failed or is still running.
+An interrupted or partly failed load can be re-run with the same
+checkpoint file; it skips everything already committed.
+"""
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Optional, Tuple
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+from ..config import Config
+from ..storage.mysql import MySQLStorage
+from ..services.traffic import TrafficService
+from ..services.ndjson import open_decoded, iter_lines, parse_event
+from ..services.path_templates import seeded_templater
+
+logger = logging.getLogger(__name__)
+
+COMPRESSED_SUFFIXES = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd'}
+
+
+class Checkpoint:
+    """Per-file resume state persisted as JSON: {"line": n, "ranges": [[first, last], ...]}."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.offsets: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.offsets = {
+                    # Older checkpoints hold just the line number
+                    file_path: state if isinstance(state, dict) else {'line': state, 'ranges': []}
+                    for file_path, state in json.load(f).items()
+                }
+
+    def get(self, file_path: str) -> Tuple[int, List[List[int]]]:
+        state = self.offsets.get(os.path.abspath(file_path), {})
+        return state.get('line', 0), state.get('ranges', [])
+
+    def set(self, file_path: str, line_no: int, ranges: List[List[int]]):
+        with self._lock:
+            self.offsets[os.path.abspath(file_path)] = {'line': line_no, 'ranges': ranges}
+            if self.path:
+                tmp = f"{self.path}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(self.offsets, f)
+                os.replace(tmp, self.path)
+
+
+class FileProgress:
+    """Tracks a file's committed chunks for its checkpoint.
+
+    The line number advances only over contiguously committed chunks;
+    chunks committed after an earlier one that failed or is still running
+    are recorded as line ranges, so a resumed load skips them too.
+    """
+
+    def __init__(self, file_path: str, checkpoint: Checkpoint):
+        self.file_path = file_path
+        self.checkpoint = checkpoint
+        self.resume_line, self.resume_ranges = checkpoint.get(file_path)
+        self._line = self.resume_line
+        self._lines: Dict[int, Tuple[int, int]] = {}
+        self._done = set()
+        self._next_seq = 0
+        self._next_commit = 0
+        self._lock = threading.Lock()
+
+    def committed_before(self, line_no: int) -> bool:
+        """True if a previous run already committed line_no."""
+        return line_no <= self.resume_line or any(first <= line_no <= last for first, last in self.resume_ranges)
+
+    def submitted(self, first_line: int, last_line: int) -> int:
+        with self._lock:
+            seq = self._next_seq
+            self._lines[seq] = (first_line, last_line)
+            self._next_seq += 1
+            return seq
+
+    def completed(self, seq: int):
+        with self._lock:
+            self._done.add(seq)
+            while self._next_commit in self._done:
+                self._done.remove(self._next_commit)
+                self._line = self._lines.pop(self._next_commit)[1]
+                self._next_commit += 1
+            ranges = [r for r in self.resume_ranges if r[1] > self._line]
+            ranges += [list(self._lines[done]) for done in sorted(self._done)]
+            self.checkpoint.set(self.file_path, self._line, ranges)
+
+    def finished(self, last_line: int):
+        """Every chunk up to last_line committed: collapse the checkpoint to a single line number."""
+        with self._lock:
+            self._line = max(self._line, last_line)
+            self.checkpoint.set(self.file_path, self._line, [])
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lines = 0
+        self.stored = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def add(self, stored: int = 0, rejected: int = 0):
+        with self._lock:
+            self.stored += stored
+            self.rejected += rejected
+
+    def line(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.stored / elapsed if elapsed > 0 else 0.0
+        return (f"lines={self.lines} stored={self.stored} rejected={self.rejected} "
+                f"elapsed={elapsed:.1f}s rate={rate:.0f} rows/sec")
+
+
+def _encoding_for(path: str) -> str:
+    return COMPRESSED_SUFFIXES.get(os.path.splitext(path)[1].lower(), 'identity')
+
+
+def load_file(path: str, write, executor: ThreadPoolExecutor, slots: threading.Semaphore,
+              checkpoint: Checkpoint, stats: Stats, chunk_size: int, report_every: float):
+    progress = FileProgress(path, checkpoint)
+    if progress.resume_line or progress.resume_ranges:
+        logger.info("Resuming %s after line %d, skipping %d committed ranges beyond it",
+                    path, progress.resume_line, len(progress.resume_ranges))
+    futures: List[Future] = []
+    last_report = time.perf_counter()
+
+    def run_chunk(index: int, chunk: List[Dict[str, Any]], first_line: int, last_line: int):
+        try:
+            write(chunk)
+            stats.add(stored=len(chunk))
+            progress.completed(index)
+        except Exception as e:
+            stats.add(rejected=len(chunk))
+            logger.error("%s lines %d-%d failed: %s", path, first_line, last_line, str(e))
+            raise
+        finally:
+            slots.release()
+
+    def submit(chunk, first_line, last_line):
+        slots.acquire()
+        index = progress.submitted(first_line, last_line)
+        futures.append(executor.submit(run_chunk, index, chunk, first_line, last_line))
+
+    with open(path, 'rb') as raw:
+        stream = open_decoded(raw, _encoding_for(path))
+        chunk: List[Dict[str, Any]] = []
+        first_line = last_line = line_no = 0
+        for line_no, line in iter_lines(stream):
+            if progress.committed_before(line_no):
+                continue
+            if line is not None and not line.strip():
+                continue
+            stats.lines += 1
+            try:
+                if line is None:
+                    raise ValueError("Line exceeds maximum length")
+                event = parse_event(line)
+            except ValueError as e:
+                stats.add(rejected=1)
+                logger.warning("%s line %d rejected: %s", path, line_no, str(e))
+                continue
+            if not chunk:
+                first_line = line_no
+            chunk.append(event)
+            last_line = line_no
+            if len(chunk) >= chunk_size:
+                submit(chunk, first_line, last_line)
+                chunk = []
+            if time.perf_counter() - last_report >= report_every:
+                print(f"[{os.path.basename(path)}] {stats.line()}", flush=True)
+                last_report = time.perf_counter()
+        if chunk:
+            submit(chunk, first_line, last_line)
+
+    failed = sum(1 for f in futures if f.exception() is not None)
+    if failed:
+        logger.error("%s: %d chunks failed; re-run with the checkpoint to retry them", path, failed)
+    else:
+        progress.finished(line_no)
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk load JSONL traffic captures into MySQL.")
+    parser.add_argument('files', nargs='+', help="JSONL files (.jsonl, .jsonl.gz, .jsonl.zst)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="events per insert chunk")
+    parser.add_argument('--workers', type=int, default=4, help="parallel insert workers")
+    parser.add_argument('--checkpoint', help="checkpoint file used to resume interrupted loads")
+    parser.add_argument('--no-infile', action='store_true', help="never use LOAD DATA LOCAL INFILE")
+    parser.add_argument('--mysql-uri', default=None, help="override the MYSQL_* environment settings")
+    parser.add_argument('--report-every', type=float, default=5.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    config = Config()
+    storage = MySQLStorage(args.mysql_uri or config.MYSQL_URI,
+                           insert_chunk_size=args.chunk_size,
+                           local_infile=not args.no_infile)
+    # Learned parameter positions from the catalog, so loaded traffic is templated like live traffic
+    templater = seeded_templater(storage, learn_threshold=config.PATH_TEMPLATE_LEARN_THRESHOLD)
+    traffic_service = TrafficService(storage, chunk_size=args.chunk_size, templater=templater)
+    if not args.no_infile and storage.supports_local_infile():
+        logger.info("Using LOAD DATA LOCAL INFILE")
+        write = traffic_service.load_events
+    else:
+        logger.info("LOAD DATA LOCAL INFILE unavailable; using batched inserts")
+        write = traffic_service.store_events
+
+    checkpoint = Checkpoint(args.checkpoint)
+    stats = Stats()
+    slots = threading.Semaphore(args.workers * 2)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for path in args.files:
+            failed += load_file(path, write, executor, slots, checkpoint, stats,
+                                args.chunk_size, args.report_every)
+            print(f"[{os.path.basename(path)}] done: {stats.line()}", flush=True)
+
+    print(f"Total: files={len(args.files)} {stats.line()}", flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+"""Daily partition maintenance for traffic_events.
+
+Usage (e.g. from a daily cron job):
+    python -m src.cli.partitions --days-ahead 7 --retention-days 30
+
+Creates daily partitions up to --days-ahead days in the future and drops
+partitions older than --retention-days, which is far cheaper than deleting
+expired rows.
+"""
+from typing import List, Optional
+import argparse
+import logging
+
+from sqlalchemy import create_engine
+
+from ..config import Config
+from ..storage.partitions import PartitionManager
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain daily traffic_events partitions.")
+    parser.add_argument('--days-ahead', type=int, default=7, help="days of future partitions to keep ready")
+    parser.add_argument('--retention-days', type=int, default=None,
+                        help="drop partitions older than this many days (default: keep everything)")
+    parser.add_argument('--mysql-uri', default=None, help="override the MYSQL_* environment settings")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    manager = PartitionManager(create_engine(args.mysql_uri or Config().MYSQL_URI))
+    created = manager.ensure_partitions(days_ahead=args.days_ahead)
+    print(f"Created {len(created)} partitions")
+    if args.retention_days is not None:
+        dropped = manager.apply_retention(args.retention_days)
+        print(f"Dropped {len(dropped)} partitions: {', '.join(dropped) or '-'}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
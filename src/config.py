@@ -7,6 +7,42 @@ class Config:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'kusho_password')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'kusho_traffic')
 
+    INGEST_BULK_INSERT = os.getenv('INGEST_BULK_INSERT', 'true').lower() == 'true'
+    INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 1000))
+
+    PATH_TEMPLATE_LEARN_THRESHOLD = int(os.getenv('PATH_TEMPLATE_LEARN_THRESHOLD', 100))
+
+    INGEST_BUFFER_ENABLED = os.getenv('INGEST_BUFFER_ENABLED', 'true').lower() == 'true'
+    INGEST_BUFFER_MAX_EVENTS = int(os.getenv('INGEST_BUFFER_MAX_EVENTS', 50000))
+    INGEST_BUFFER_BATCH_SIZE = int(os.getenv('INGEST_BUFFER_BATCH_SIZE', 5000))
+    INGEST_BUFFER_MAX_AGE_MS = int(os.getenv('INGEST_BUFFER_MAX_AGE_MS', 500))
+    INGEST_BUFFER_DRAIN_TIMEOUT = float(os.getenv('INGEST_BUFFER_DRAIN_TIMEOUT', 25))
+
+    ANALYSIS_MODEL_MAX_AGE_HOURS = float(os.getenv('ANALYSIS_MODEL_MAX_AGE_HOURS', 24))
+    ANALYSIS_REFERENCE_SAMPLE_SIZE = int(os.getenv('ANALYSIS_REFERENCE_SAMPLE_SIZE', 200))
+    ANALYSIS_MAX_FEATURES = int(os.getenv('ANALYSIS_MAX_FEATURES', 4096))
+    ANALYSIS_VECTORIZER_MODE = os.getenv('ANALYSIS_VECTORIZER_MODE', 'tfidf')
+    ANALYSIS_HASH_FEATURES = int(os.getenv('ANALYSIS_HASH_FEATURES', 2 ** 18))
+    ANALYSIS_BODY_CACHE_SIZE = int(os.getenv('ANALYSIS_BODY_CACHE_SIZE', 0))
+    ANALYSIS_RULES_FILE = os.getenv('ANALYSIS_RULES_FILE')
+    ANALYSIS_BASELINE_HALF_LIFE_HOURS = float(os.getenv('ANALYSIS_BASELINE_HALF_LIFE_HOURS', 72))
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 1))
+    ANALYSIS_FETCH_CHUNK_SIZE = int(os.getenv('ANALYSIS_FETCH_CHUNK_SIZE', 2000))
+    ANALYSIS_WINDOW_SAMPLE_SIZE = int(os.getenv('ANALYSIS_WINDOW_SAMPLE_SIZE', 20000))
+    ANALYSIS_WATERMARK_LAG_SECONDS = float(os.getenv('ANALYSIS_WATERMARK_LAG_SECONDS', 300))
+    ANOMALIES_PAGE_SIZE = int(os.getenv('ANOMALIES_PAGE_SIZE', 500))
+    ANOMALIES_MAX_PAGE_SIZE = int(os.getenv('ANOMALIES_MAX_PAGE_SIZE', 5000))
+    # Test generation: concurrent LLM calls and per-minute budgets (0 = unlimited)
+    GENERATION_CONCURRENCY = int(os.getenv('GENERATION_CONCURRENCY', 8))
+    GENERATION_REQUESTS_PER_MINUTE = int(os.getenv('GENERATION_REQUESTS_PER_MINUTE', 500))
+    GENERATION_TOKENS_PER_MINUTE = int(os.getenv('GENERATION_TOKENS_PER_MINUTE', 200000))
+    # Most reference events of one endpoint sent in a single prompt (1 = one prompt per event)
+    GENERATION_BATCH_SIZE = int(os.getenv('GENERATION_BATCH_SIZE', 20))
+    # Generated test cases are reused for identical requests within the TTL
+    GENERATION_CACHE_ENABLED = os.getenv('GENERATION_CACHE_ENABLED', 'true').lower() == 'true'
+    GENERATION_CACHE_TTL_HOURS = float(os.getenv('GENERATION_CACHE_TTL_HOURS', 168))
+    GENERATION_CACHE_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', 10000))
+
     @property
     def MYSQL_URI(self):
         return f"mysql+pymysql://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
\ No newline at end of file
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Fields of a reference event that do not change the generated tests
+VOLATILE_FIELDS = {'timestamp', 'id'}
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        # Request bodies are sometimes stored as JSON text
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return value.strip()
+        return _normalize(parsed) if isinstance(parsed, (dict, list)) else value.strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_fingerprint(endpoint_data: Dict[str, Any], model: str, prompt_template: str = '') -> str:
+    """sha256 of the normalized request, the model and the prompt template.
+
+    Timestamps and ids are left out, the method is upper-cased, and JSON is
+    compared with sorted keys, so the same request seen in different
+    anomalies shares one fingerprint. Changing the prompt template or the
+    model gives new fingerprints.
+    """
+    normalized = {
+        k: _normalize(v) for k, v in endpoint_data.items()
+        if k not in VOLATILE_FIELDS and v is not None
+    }
+    if normalized.get('http_method'):
+        normalized['http_method'] = str(normalized['http_method']).upper()
+    key = json.dumps([model, hashlib.sha256(prompt_template.encode()).hexdigest(), normalized],
+                     sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class GenerationCache:
+    """Generated test cases per request fingerprint, persisted through the storage backend.
+
+    Entries older than ttl_hours are ignored and deleted by evict(), which
+    also drops the least recently used entries beyond max_entries. Counts
+    hits and misses and the dollars saved by hits (the cost recorded by
+    calculate_cost when the entry was generated).
+    """
+
+    def __init__(self, storage, ttl_hours: float = 168, max_entries: int = 10000):
+        self.storage = storage
+        self.ttl_hours = ttl_hours
+        self.max_entries = max_entries
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.dollars_saved = 0.0
+        self.dollars_spent = 0.0
+
+    def _min_created_at(self) -> datetime:
+        return datetime.now() - timedelta(hours=self.ttl_hours)
+
+    async def get(self, fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            entry = await self.storage.get_generation_cache_entry(fingerprint, self._min_created_at())
+        except Exception as e:
+            logger.warning(f"Generation cache lookup failed: {str(e)}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.dollars_saved += entry['cost']
+        return entry['test_cases']
+
+    async def put(self, fingerprint: str, model: str, test_cases: List[Dict[str, Any]], cost: float):
+        self.dollars_spent += cost
+        try:
+            await self.storage.save_generation_cache_entry(fingerprint, model, test_cases, cost)
+        except Exception as e:
+            logger.warning(f"Could not save generation cache entry: {str(e)}")
+
+    async def evict(self) -> int:
+        deleted = await self.storage.evict_generation_cache(self._min_created_at(), self.max_entries)
+        if deleted:
+            logger.info(f"Evicted {deleted} generation cache entries")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'dollars_saved': round(self.dollars_saved, 6),
+            'dollars_spent': round(self.dollars_spent, 6)
+        }
@@ -0,0 +1,56 @@
+from typing import List
+
+
+class JSONObjectScanner:
+    """Splits top-level JSON objects out of text that arrives in pieces.
+
+    feed() returns the text of every object that closed in the new piece.
+    Only braces outside strings are counted, so objects inside a top-level
+    array, objects separated by commas or newlines, and objects surrounded
+    by prose or code fences are all found. Each character is looked at once,
+    and only the object being read is kept, so scanning is linear in the
+    length of the response. The returned text is not validated; callers
+    parse it.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []  # pieces of the object being read
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def pending(self) -> bool:
+        """True while an object has been opened but not closed."""
+        return self._depth > 0
+
+    def feed(self, text: str) -> List[str]:
+        objects = []
+        start = 0 if self._depth else None
+        depth, in_string, escaped = self._depth, self._in_string, self._escaped
+        for i, char in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                # Strings only matter inside an object; quotes in surrounding prose are ignored
+                in_string = depth > 0
+            elif char == '{':
+                if depth == 0:
+                    start = i
+                depth += 1
+            elif char == '}' and depth:
+                depth -= 1
+                if depth == 0:
+                    self._parts.append(text[start:i + 1])
+                    objects.append(''.join(self._parts))
+                    self._parts = []
+                    start = None
+        if depth and start is not None:
+            self._parts.append(text[start:])
+        self._depth, self._in_string, self._escaped = depth, in_string, escaped
+        return objects
@@ -1,5 +1,5 @@
 import json
-from typing import List, Literal, Optional, Tuple
+from typing import AsyncGenerator, Dict, List, Literal, Optional, Tuple
 import openai
 from tenacity import (
     retry,
@@ -8,15 +8,18 @@ from tenacity import (
     wait_random,
 )
 from collections import OrderedDict
-import tiktoken
 import logging
 import os
 
+from .tokens import count_tokens, cost_tracker, get_encoding
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 ORG_ID = os.getenv('OPENAI_ORG_ID', '')
 API_KEY = os.getenv('OPENAI_API_KEY', '')
+# Point at any OpenAI-compatible server, e.g. a local stub for load tests
+BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 
 openai.organization = ORG_ID
 openai.api_key = API_KEY
@@ -30,9 +33,24 @@ GPT_4_8K: str = "gpt-4"
 openai_client = openai.Client(
     api_key=API_KEY,
     organization=ORG_ID,
+    base_url=BASE_URL,
+)
+
+# Transient errors worth retrying; anything else (bad request, auth) fails at once
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.RateLimitError,
+    openai.InternalServerError,
 )
 
 
+def make_async_client(base_url: Optional[str] = None) -> openai.AsyncOpenAI:
+    """New async client; it binds to the running event loop, so create one per loop and close it."""
+    # Retries are handled by _open_stream_async so they go through the rate limiter
+    return openai.AsyncOpenAI(api_key=API_KEY, organization=ORG_ID, base_url=base_url or BASE_URL, max_retries=0)
+
+
 MODEL_INFO = OrderedDict(
     [
         (
@@ -74,124 +92,137 @@ MODEL_INFO = OrderedDict(
     ]
 )
 
-BIGGEST_MODEL = MODEL_INFO[GPT_3_5_16K]
+BIGGEST_MODEL = GPT_3_5_16K
 
 def get_models():
     return openai_client.models.list()
 
-# @retry(
-#     stop=stop_after_attempt(3),
-#     wait=wait_random(min=0.5, max=1.5),
-# )
-# def chat_completion_streaming(
-#     prompt: str,
-#     model: str = GPT_3_5_4K,
-#     max_tokens: int = 1000,
-#     temperature: float = 0.5,
-# ):
-#     messages: List = [
-#         {"role": "system", "content": "You are a helpful assistant."},
-#         {"role": "user", "content": prompt},
-#     ]
-#     model, max_tokens = get_model_max_token_from_prompt(
-#         prompt=json.dumps(messages),
-#         model=model  # type: ignore
-#     )
-#     print(f"[openai_utils - chat completion streaming] model: {model}, max_tokens: {max_tokens}")
-#     response = openai.chat.completions.create(
-#         model=model,
-#         messages=messages,
-#         max_tokens=max_tokens,
-#         temperature=temperature,
-#         stream=True
-#     )
-    
-#     current_response = ""
-#     for chunk in response:
-#         data = chunk.model_dump()
-#         delta = data["choices"][0]["delta"]
-        
-#         if "content" in delta and delta["content"]:
-#             content = delta["content"]
-#             current_response += content
-#             logger.info(f"this is content data {content}")
-#             yield content
-        
-#         # Check if we're at the end of the stream
-#         if data["choices"][0]["finish_reason"] is not None:
-#             yield "[DONE]"
-#             break
-    
-#     calculate_cost(prompt, current_response, model)
-
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_random(min=0.5, max=1.5),
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    reraise=True,
 )
-def chat_completion_streaming(
+async def _open_stream_async(client: openai.AsyncOpenAI, rate_limiter, reserved: int, **params):
+    if rate_limiter is not None:
+        await rate_limiter.acquire(reserved)
+    try:
+        return await client.chat.completions.create(stream=True, **params)
+    except Exception:
+        if rate_limiter is not None:
+            rate_limiter.settle(reserved, 0)
+        raise
+
+
+async def chat_completion_stream_async(
+    client: openai.AsyncOpenAI,
     prompt: str,
     model: str = GPT_3_5_4K,
-    max_tokens: int = 1000,
     temperature: float = 0.5,
-):
+    rate_limiter=None,
+    expected_completion_tokens: int = 1000,
+    usage: Optional[Dict] = None,
+) -> AsyncGenerator[str, None]:
+    """Yield content deltas of a streamed completion on the async client.
+
+    Opening the stream is retried, and each attempt first reserves its
+    estimated tokens with the rate limiter. Streams carry no usage, so
+    the reservation is settled with tiktoken counts once the stream ends
+    (the prompt is counted once, the response once). A usage dict, if
+    given, is filled with the model, token counts and the calculate_cost of
+    the call.
+    """
     messages: List = [
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": prompt},
     ]
-    model, max_tokens = get_model_max_token_from_prompt(
-        prompt=json.dumps(messages),
-        model=model  # type: ignore
+    model, max_tokens, prompt_tokens = fit_model(json.dumps(messages), model=model)
+    reserved = prompt_tokens + expected_completion_tokens
+    stream = await _open_stream_async(
+        client, rate_limiter, reserved,
+        model=model, messages=messages, max_tokens=max_tokens, temperature=temperature
     )
-    print(f"[openai_utils - chat completion streaming] model: {model}, max_tokens: {max_tokens}")
-    
-    response = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=max_tokens,
-        temperature=temperature,
-    )
-    
-    data = response.model_dump()
-    # logger.info(f"Complete response data: {json.dumps(data, indent=2)}")
-    
-    content = data["choices"][0]["message"]["content"]
-    
-    calculate_cost(prompt, content, model)
-    
-    yield content
-    yield "[DONE]"
+    parts = []
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+        response = "".join(parts)
+        completion_tokens = get_tokens_len(response, model)
+        if rate_limiter is not None:
+            rate_limiter.settle(reserved, prompt_tokens + completion_tokens)
+        cost = calculate_cost(prompt, response, model, prompt_tokens, completion_tokens)
+        if usage is not None:
+            usage.update(model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost=cost)
+
+def fit_model(
+    prompt: str,
+    min_response_token_length: Optional[int] = None,
+    model: str = GPT_3_5_4K,
+) -> Tuple[str, int, int]:
+    """Pick the model for prompt; returns it, the tokens left for the response and the prompt's tokens.
+
+    The requested model is used when the prompt fits its prompt token limit
+    (and leaves min_response_token_length, if given); otherwise the first
+    model in MODEL_INFO that does, else BIGGEST_MODEL. The prompt is encoded
+    once per distinct encoding, not once per model tried.
+    """
+    counts: Dict[str, int] = {}
+
+    def token_len(model_name: str) -> int:
+        name = get_encoding(model_name).name
+        if name not in counts:
+            counts[name] = get_tokens_len(prompt, model_name)
+        return counts[name]
+
+    def fits(model_name: str) -> bool:
+        info = MODEL_INFO[model_name]
+        left = int(info["token_limit"]) - token_len(model_name)
+        return (int(info["prompt_token_limit"]) >= token_len(model_name)
+                and (not min_response_token_length or min_response_token_length <= left))
+
+    for model_name in [model, *MODEL_INFO]:
+        if model_name in MODEL_INFO and fits(model_name):
+            break
+    else:
+        model_name = BIGGEST_MODEL
+    prompt_tokens = token_len(model_name)
+    return (model_name, int(MODEL_INFO[model_name]["token_limit"]) - prompt_tokens, prompt_tokens)
 
 def get_model_max_token_from_prompt(
     prompt: str,
     min_response_token_length: Optional[int] = None,
     model: Literal["gpt-3.5-turbo", "gpt-3.5-turbo-16k", "gpt-4"] = GPT_3_5_4K,
 ) -> Tuple[str, int]:
-    token_len = get_tokens_len(prompt=prompt, model=model)
-    if int(MODEL_INFO[model]["prompt_token_limit"]) >= token_len and not min_response_token_length:
-        return (model, int(MODEL_INFO[model]["token_limit"]) - token_len)
-    for model_name, model_info in MODEL_INFO.items():
-        token_len = get_tokens_len(prompt=prompt, model=model_name)
-        if min_response_token_length:
-            if int(model_info["prompt_token_limit"]) >= token_len and (min_response_token_length <= (int(model_info["token_limit"]) - token_len)):
-                return (model_name, int(model_info["token_limit"]) - token_len)
-        elif int(model_info["prompt_token_limit"]) >= token_len:
-            return (model_name, int(model_info["token_limit"]) - token_len)
-    return (BIGGEST_MODEL, int(BIGGEST_MODEL["token_limit"]) - token_len)
+    model, max_tokens, _ = fit_model(prompt, min_response_token_length, model)
+    return (model, max_tokens)
 
-def get_tokens_len(prompt: str, model: str = GPT_3_5_4K) -> int:
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    buffer = 100  
-    return len(encoding.encode(prompt)) + buffer
+# Added to every token count as a safety margin
+TOKEN_BUFFER = 100
 
-total = {"cost": 0}
+def get_tokens_len(prompt: str, model: str = GPT_3_5_4K) -> int:
+    return count_tokens(prompt, model) + TOKEN_BUFFER
 
-def calculate_cost(prompt, response, model) -> float:
-    prompt_tokens = get_tokens_len(prompt, model)
-    response_tokens = get_tokens_len(response, model)
+def calculate_cost(
+    prompt: str,
+    response: str,
+    model: str,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> float:
+    """Price of a call, added to the process-wide cost_tracker.
+
+    Pass the token counts when they are known (the usage the API reports,
+    or counts already taken); only the missing ones are counted here.
+    """
+    if prompt_tokens is None:
+        prompt_tokens = get_tokens_len(prompt, model)
+    if completion_tokens is None:
+        completion_tokens = get_tokens_len(response, model)
     prompt_price = prompt_tokens * float(MODEL_INFO[model]["prompt_pricing"])
-    response_price = response_tokens * float(MODEL_INFO[model]["response_pricing"])
-    total["cost"] += prompt_price + response_price
+    response_price = completion_tokens * float(MODEL_INFO[model]["response_pricing"])
+    cost_tracker.record(model, prompt_tokens, completion_tokens, prompt_price + response_price)
     return prompt_price + response_price
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Bucket:
+    """Token bucket refilled continuously at limit per minute, holding burst_seconds' worth."""
+
+    def __init__(self, per_minute: float, burst_seconds: float, now: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (amounts above capacity wait for a full bucket)."""
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) / self.rate
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by concurrent LLM calls.
+
+    acquire(tokens) waits until one request and the estimated tokens fit
+    both budgets; callers are served in arrival order. settle() corrects the
+    token budget once the actual usage is known, so a low estimate is paid
+    back by later calls. Bursts are capped at burst_seconds of budget, since
+    providers enforce per-minute limits over shorter windows. A limit of
+    None or 0 is not enforced.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 burst_seconds: float = 1.0, clock=time.monotonic):
+        self.clock = clock
+        now = clock()
+        self.requests = _Bucket(requests_per_minute, burst_seconds, now) if requests_per_minute else None
+        self.tokens = _Bucket(tokens_per_minute, burst_seconds, now) if tokens_per_minute else None
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self, tokens: int = 0):
+        async with self._lock:
+            while True:
+                now = self.clock()
+                wait = 0.0
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0:
+                    break
+                self.waited_seconds += wait
+                await asyncio.sleep(wait)
+            if self.requests is not None:
+                self.requests.level -= 1
+            if self.tokens is not None:
+                self.tokens.level -= tokens
+
+    def settle(self, reserved_tokens: int, used_tokens: int):
+        """Replace a call's estimated tokens with the tokens it actually used."""
+        if self.tokens is not None:
+            self.tokens.refill(self.clock())
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + reserved_tokens - used_tokens)
@@ -1,28 +1,35 @@
 # test_utils.py
 import logging
 import json
-import asyncio
-from typing import Dict, List, AsyncGenerator
-from functools import partial
+import time
+from typing import Dict, List, AsyncGenerator, Optional, Tuple
 
+from .cache import GenerationCache, request_fingerprint
+from .json_stream import JSONObjectScanner
 from .llm_utils import (
-    chat_completion_streaming,
-    GPT_3_5_16K
+    chat_completion_stream_async,
+    get_tokens_len,
+    make_async_client,
+    GPT_3_5_16K,
+    MODEL_INFO
 )
+from .rate_limit import RateLimiter
+from .tokens import approximate_tokens, count_tokens
 
 logger = logging.getLogger(__name__)
 
-TEST_GENERATION_PROMPT = """Generate API test cases for this endpoint based on the provided traffic patterns.
-Return each test case one at a time in valid JSON format.
+TEST_GENERATION_PROMPT = """Generate API test cases for this endpoint based on the provided traffic samples.
 
 Endpoint: {url}
 Method: {http_method}
 
-Complete request
-{complete_request}
+Each sample is one observed request with its concrete url, numbered by its sample_index.
 
-For each test case, return in this exact JSON format:
+{samples}
+Return a JSON array of test cases covering every sample.
+For each test case, use this exact JSON format:
 {{
+    "sample_index": <sample_index of the sample the test case is based on>,
     "description": "Meaningful description for the Test case",
     "category": ["functional"|"security"|"performance"|"validation"],
     "priority": "high"|"medium"|"low",
@@ -39,66 +46,191 @@ For each test case, return in this exact JSON format:
 Generate realistic test cases based on the sample traffic patterns.
 Return one complete test case at a time, ensuring each is valid JSON."""
 
+SAMPLE_TEMPLATE = """Sample {sample_index}:
+{request}
+
+"""
+
+# Response tokens reserved per sample when packing prompts
+COMPLETION_TOKENS_PER_SAMPLE = 600
+
+def _endpoint_path(endpoint_data: Dict) -> str:
+    """Path template of the sample's endpoint; each sample keeps its concrete url."""
+    return endpoint_data.get("path_template") or endpoint_data.get("url") or ""
+
+
 class TestGenerator:
-    def __init__(self):
-        self.cache = {}
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, model: str = GPT_3_5_16K,
+                 temperature: float = 0.7, base_url: Optional[str] = None,
+                 cache: Optional[GenerationCache] = None, max_batch_size: int = 20):
+        self.cache = cache
+        self.max_batch_size = max(1, max_batch_size)
+        self.rate_limiter = rate_limiter
+        self.model = model
+        self.temperature = temperature
+        self.base_url = base_url  # defaults to OPENAI_BASE_URL
+        self._client = None
         logger.info("TestGenerator initialized")
 
+    async def aclose(self):
+        """Close the async LLM client (it is recreated on the next call)."""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def fingerprint(self, endpoint_data: Dict) -> str:
+        """Cache key of the test cases this generator would produce for endpoint_data."""
+        return request_fingerprint(endpoint_data, self.model, TEST_GENERATION_PROMPT)
+
+    def plan_batches(self, items: List[Tuple[int, Dict]]) -> List[List[Tuple[int, Dict]]]:
+        """Pack (anomaly_id, endpoint_data) items into batches that share one prompt.
+
+        Items are grouped by endpoint (method and path template, so
+        /users/1 and /users/2 share prompts), and each group is cut
+        into batches of at most max_batch_size samples whose prompt fits the
+        model's prompt token limit while leaving COMPLETION_TOKENS_PER_SAMPLE
+        of response per sample within its token limit. Samples are sized with
+        the cheap approximate_tokens bound; a batch is only encoded once that
+        bound no longer fits.
+        """
+        info = MODEL_INFO[self.model]
+        prompt_limit = int(info["prompt_token_limit"])
+        total_limit = int(info["token_limit"])
+
+        def fits(samples: int, prompt_tokens: int) -> bool:
+            return (samples <= self.max_batch_size
+                    and prompt_tokens <= prompt_limit
+                    and prompt_tokens + samples * COMPLETION_TOKENS_PER_SAMPLE <= total_limit)
+
+        groups: Dict[Tuple[str, str], List[Tuple[int, Dict]]] = {}
+        for anomaly_id, endpoint_data in items:
+            endpoint = (str(endpoint_data.get("http_method") or "").upper(), _endpoint_path(endpoint_data))
+            groups.setdefault(endpoint, []).append((anomaly_id, endpoint_data))
+
+        batches = []
+        for group in groups.values():
+            header = self._create_prompt([group[0][1]], with_samples=False)
+            base_tokens = get_tokens_len(self._escape(header), self.model)
+            batch, texts, prompt_tokens, exact = [], [], base_tokens, False
+            for anomaly_id, endpoint_data in group:
+                text = self._escape(self._format_sample(len(batch), endpoint_data))
+                sample_tokens = count_tokens(text, self.model) if exact else approximate_tokens(text)
+                if not exact and not fits(len(batch) + 1, prompt_tokens + sample_tokens):
+                    # The bound is loose; count the batch exactly before closing it
+                    exact = True
+                    prompt_tokens = base_tokens + sum(count_tokens(t, self.model) for t in texts)
+                    sample_tokens = count_tokens(text, self.model)
+                if batch and not fits(len(batch) + 1, prompt_tokens + sample_tokens):
+                    batches.append(batch)
+                    batch, texts, prompt_tokens, exact = [], [], base_tokens, False
+                    text = self._escape(self._format_sample(0, endpoint_data))
+                    sample_tokens = approximate_tokens(text)
+                batch.append((anomaly_id, endpoint_data))
+                texts.append(text)
+                prompt_tokens += sample_tokens
+            batches.append(batch)
+        return batches
+
     async def generate_streaming(self, endpoint_data: Dict) -> AsyncGenerator[str, None]:
-        """Generate test cases with streaming response"""
-        logger.info(f"Starting generation for endpoint: {endpoint_data.get('url')}")
-        prompt = self._create_prompt(endpoint_data)
-        
-        current_chunk = ""
-        try:
-            # Create a loop and executor for running the streaming function
-            loop = asyncio.get_event_loop()
-            chat_completion_partial = partial(
-                chat_completion_streaming,
-                prompt=prompt,
-                model=GPT_3_5_16K,
-                temperature=0.7
-            )
-            
-            # Run the streaming in the executor
-            stream_generator = await loop.run_in_executor(None, chat_completion_partial)
-            
-            for chunk in stream_generator:
-                if chunk == "[DONE]":
-                    if current_chunk:
-                        try:
-                            # Try to parse any remaining chunk
-                            json.loads(current_chunk)
-                            yield current_chunk
-                        except:
-                            pass
-                    yield "[DONE]"
-                    break
-                
-                current_chunk += chunk
-                
-                # Try to find complete JSON objects
-                try:
-                    # Check if we have a complete JSON object
-                    json.loads(current_chunk)
-                    yield current_chunk
-                    current_chunk = ""
-                except json.JSONDecodeError:
-                    # Keep accumulating chunks until we have valid JSON
+        """Yield each generated test case (JSON text) for one request as soon as it is parsed, then "[DONE]"."""
+        async for _, test_case in self.generate_batch_streaming([endpoint_data]):
+            yield json.dumps(test_case)
+        yield "[DONE]"
+
+    async def generate_batch_streaming(self, samples: List[Dict]) -> AsyncGenerator[Tuple[int, Dict], None]:
+        """Yield (sample position, test case) for samples of one endpoint, generated with a single prompt.
+
+        Test cases are yielded as soon as they close in the stream and are
+        mapped back to their sample by the sample_index the model echoes;
+        cases with a missing or unknown index are attributed to the first
+        sample. With a cache, samples whose fingerprint was generated before
+        are replayed without calling the model and only the rest are sent.
+        Fresh results are cached per sample once the response has been read
+        completely, each sample carrying an equal share of the cost.
+        """
+        logger.info(f"Starting generation for endpoint: {samples[0].get('url')} ({len(samples)} samples)")
+        keys: List[Optional[str]] = [None] * len(samples)
+        pending: List[int] = []
+        for position, endpoint_data in enumerate(samples):
+            if self.cache is not None:
+                keys[position] = self.fingerprint(endpoint_data)
+                cached = await self.cache.get(keys[position])
+                if cached is not None:
+                    logger.debug(f"Generation cache hit for endpoint: {endpoint_data.get('url')}")
+                    for test_case in cached:
+                        yield position, test_case
                     continue
-                
+            pending.append(position)
+        if not pending:
+            return
+
+        prompt = self._create_prompt([samples[position] for position in pending])
+
+        scanner = JSONObjectScanner()
+        started = time.perf_counter()
+        emitted = 0
+        generated: Dict[int, List[Dict]] = {position: [] for position in pending}
+        usage: Dict = {}
+        try:
+            # The client is created in the running loop; concurrent calls share its connection pool
+            if self._client is None:
+                self._client = make_async_client(self.base_url)
+            async for content in chat_completion_stream_async(
+                self._client,
+                prompt,
+                model=self.model,
+                temperature=self.temperature,
+                rate_limiter=self.rate_limiter,
+                expected_completion_tokens=len(pending) * COMPLETION_TOKENS_PER_SAMPLE,
+                usage=usage
+            ):
+                for candidate in scanner.feed(content):
+                    try:
+                        test_case = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed test case from the model: {candidate[:200]}")
+                        continue
+                    sample_index = test_case.pop("sample_index", None)
+                    if not isinstance(sample_index, int) or not 0 <= sample_index < len(pending):
+                        if len(pending) > 1:
+                            logger.debug(f"Test case without a valid sample_index ({sample_index!r})")
+                        sample_index = 0
+                    if not emitted:
+                        logger.debug(f"First test case after {time.perf_counter() - started:.2f}s")
+                    emitted += 1
+                    position = pending[sample_index]
+                    generated[position].append(test_case)
+                    yield position, test_case
+            if scanner.pending:
+                logger.warning("Model response ended inside an unterminated test case")
+            if self.cache is not None:
+                cost = usage.get('cost', 0.0) / len(pending)
+                for position in pending:
+                    if generated[position]:
+                        await self.cache.put(keys[position], usage.get('model', self.model), generated[position], cost)
+
         except Exception as e:
-            logger.error(f"Error in generate_streaming: {str(e)}", exc_info=True)
+            logger.error(f"Error in generate_batch_streaming: {str(e)}", exc_info=True)
             raise
 
-    def _create_prompt(self, endpoint_data: Dict) -> str:
-        """Create prompt from endpoint data"""
-        logger.debug("Creating prompt from endpoint data")
-        
+    @staticmethod
+    def _escape(text: str) -> str:
+        # Prompts are measured JSON-escaped, as fit_model counts the serialized messages
+        return json.dumps(text)[1:-1]
+
+    @staticmethod
+    def _format_sample(sample_index: int, endpoint_data: Dict) -> str:
+        return SAMPLE_TEMPLATE.format(sample_index=sample_index, request=json.dumps(endpoint_data, default=str))
+
+    def _create_prompt(self, samples: List[Dict], with_samples: bool = True) -> str:
+        """Create one prompt covering samples of the same endpoint (without them, to size the rest)"""
+        logger.debug(f"Creating prompt from {len(samples)} samples")
+
         prompt = TEST_GENERATION_PROMPT.format(
-            url=endpoint_data.get("url", ""),
-            http_method=endpoint_data.get("http_method", ""),
-            complete_request=endpoint_data
+            url=_endpoint_path(samples[0]),
+            http_method=samples[0].get("http_method", ""),
+            samples="".join(self._format_sample(i, endpoint_data) for i, endpoint_data in enumerate(samples))
+            if with_samples else ""
         )
         logger.debug(f"Created prompt: {prompt[:200]}...")  # Log first 200 chars
-        return prompt
\ No newline at end of file
+        return prompt
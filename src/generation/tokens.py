@@ -0,0 +1,66 @@
+from functools import lru_cache
+from typing import Dict
+import threading
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """tiktoken encoding for model, loaded once per model (unknown models use cl100k_base)."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Exact number of tokens of text in model's encoding."""
+    return len(get_encoding(model).encode(text))
+
+
+def approximate_tokens(text: str) -> int:
+    """Cheap upper bound on count_tokens for budget pre-checks.
+
+    Every token of the BPE encodings covers at least one byte, so the UTF-8
+    length is never below the exact count. Text that fits a budget by this
+    measure needs no encoding; anything else should be counted exactly.
+    """
+    return len(text.encode("utf-8"))
+
+
+class CostTracker:
+    """Process-wide calls, tokens and dollars per model, safe to update from several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, float]] = {}
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            totals = self._models.setdefault(
+                model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost"] += cost
+
+    @property
+    def total_cost(self) -> float:
+        with self._lock:
+            return sum(totals["cost"] for totals in self._models.values())
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copy of the totals per model."""
+        with self._lock:
+            return {model: dict(totals) for model, totals in self._models.items()}
+
+    def reset(self):
+        with self._lock:
+            self._models.clear()
+
+
+cost_tracker = CostTracker()
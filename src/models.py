@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, BigInteger, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import Column, Integer, String, Float, JSON, DateTime, BigInteger, ForeignKey, UniqueConstraint, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -12,6 +12,7 @@ class TrafficEvent(Base):
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     timestamp = Column(DateTime, nullable=False)
     path = Column(String(255), nullable=False)
+    path_template = Column(String(255), nullable=False)
     method = Column(String(10), nullable=False)
     headers = Column(JSON)
     path_params = Column(JSON)
@@ -21,23 +22,67 @@ class TrafficEvent(Base):
     duration_ms = Column(Float)
     response_headers = Column(JSON)
 
+    # The table is RANGE partitioned by day on timestamp (see migrations/init.sql),
+    # so the database primary key is (id, timestamp); id alone stays unique.
+    __table_args__ = (
+        Index('idx_timestamp', 'timestamp'),
+        Index('idx_template_method_timestamp', 'path_template', 'method', 'timestamp'),
+    )
+
     # Relationship to anomalies
     anomalies = relationship("RequestAnomaly", back_populates="traffic_event")
 
+class Endpoint(Base):
+    __tablename__ = 'endpoints'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    path = Column(String(255), nullable=False)  # path template
+    method = Column(String(10), nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+    hit_count = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('path', 'method', name='unique_endpoint_path_method'),
+        Index('idx_last_seen', 'last_seen'),
+    )
+
 class RequestAnomaly(Base):
     __tablename__ = 'request_anomalies'
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # ORM-level only: partitioned traffic_events cannot carry a database foreign key
     event_id = Column(BigInteger, ForeignKey('traffic_events.id'))
     similarity_score = Column(Float)
     anomaly_type = Column(String(50))
     description = Column(Text)
     detected_at = Column(DateTime, server_default=func.current_timestamp())
-    reference_events = Column(JSON)
+    reference_events = Column(JSON)  # [{id, similarity}], nearest first; hydrated on read
 
     # Relationship to traffic event
     traffic_event = relationship("TrafficEvent", back_populates="anomalies")
 
+    __table_args__ = (
+        UniqueConstraint('event_id', 'anomaly_type', name='unique_event_anomaly'),
+        Index('idx_detected_at', 'detected_at'),
+    )
+
+
+class AnomalyRollup(Base):
+    """Anomaly counts per hour, endpoint, type and similarity-score decile.
+
+    Maintained by MySQLStorage.store_anomalies in the same transaction as
+    the anomaly rows, so summaries never scan request_anomalies.
+    """
+    __tablename__ = 'anomaly_rollups'
+
+    hour = Column(DateTime, primary_key=True)  # detected_at truncated to the hour
+    path = Column(String(255), primary_key=True)  # path template
+    method = Column(String(10), primary_key=True)
+    anomaly_type = Column(String(50), primary_key=True)
+    score_bucket = Column(Integer, primary_key=True)  # floor(similarity_score * 10), 0-9
+    anomaly_count = Column(BigInteger, nullable=False, default=0)
+
 
 class RequestPattern(Base):
     __tablename__ = 'request_patterns'
@@ -46,6 +91,9 @@ class RequestPattern(Base):
     path = Column(String(255))
     method = Column(String(10))
     pattern_vector = Column(JSON)
+    # Latency histogram and status-class counts (see analysis.baselines)
+    baseline = Column(JSON)
+    last_event_id = Column(BigInteger)
     updated_at = Column(
         DateTime, 
         server_default=func.current_timestamp(),
@@ -96,6 +144,23 @@ class TestCase(Base):
     request_body = Column(JSON)
     
 
+class GenerationCacheEntry(Base):
+    """Test cases generated for one request fingerprint, reused across jobs."""
+    __tablename__ = 'generation_cache'
+
+    fingerprint = Column(String(64), primary_key=True)  # sha256 of the normalized request, model and prompt
+    model = Column(String(50), nullable=False)
+    test_cases = Column(JSON, nullable=False)
+    cost = Column(Float, nullable=False, default=0.0)  # dollars paid to generate the entry
+    hits = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_last_used_at', 'last_used_at'),
+    )
+
+
 class Job(Base):
     __tablename__ = 'jobs'
     
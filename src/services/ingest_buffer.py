@@ -0,0 +1,151 @@
+from collections import deque
+from typing import List, Dict, Any, Callable, Deque, Optional
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFullError(Exception):
+    """Raised when the ingest buffer cannot accept more events."""
+
+
+class BatchTooLargeError(Exception):
+    """Raised for a submission that could never fit in the buffer, however long the caller waits."""
+
+
+class IngestBuffer:
+    """Bounded in-process write-behind buffer for traffic events.
+
+    Producers call submit() and return immediately; a single flusher thread
+    coalesces queued events into batches that are written once they reach
+    max_batch_size events or the oldest queued event is max_batch_age
+    seconds old.
+    """
+
+    def __init__(self, sink: Callable[[List[Dict[str, Any]]], Any], max_events: int = 50000,
+                 max_batch_size: int = 5000, max_batch_age: float = 0.5,
+                 flush_retries: int = 3, retry_backoff: float = 0.5):
+        self.sink = sink
+        self.max_events = max_events
+        self.max_batch_size = max_batch_size
+        self.max_batch_age = max_batch_age
+        self.flush_retries = flush_retries
+        self.retry_backoff = retry_backoff
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        # [enqueued_at, count] per submission still (partly) queued, oldest first
+        self._arrivals: Deque[List[float]] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'accepted': 0, 'rejected': 0, 'flushed': 0, 'dropped': 0, 'batches': 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ingest-flusher', daemon=True)
+            self._thread.start()
+            logger.info("Ingest buffer started (max_events=%d, max_batch_size=%d, max_batch_age=%.3fs)",
+                        self.max_events, self.max_batch_size, self.max_batch_age)
+        return self
+
+    def submit(self, events: List[Dict[str, Any]]):
+        """Queue events for writing; raises BufferFullError instead of blocking.
+
+        Raises BatchTooLargeError when events alone exceed max_events, since
+        retrying the same request could never succeed.
+        """
+        if len(events) > self.max_events:
+            self.stats['rejected'] += len(events)
+            raise BatchTooLargeError(
+                f"{len(events)} events exceed the ingest buffer capacity of {self.max_events}; split the request"
+            )
+        with self._cond:
+            if self._closed:
+                raise BufferFullError("Ingest buffer is shutting down")
+            if len(self._queue) + len(events) > self.max_events:
+                self.stats['rejected'] += len(events)
+                raise BufferFullError(
+                    f"Ingest buffer full ({len(self._queue)}/{self.max_events} events queued)"
+                )
+            if not events:
+                return
+            was_empty = not self._queue
+            self._arrivals.append([time.monotonic(), len(events)])
+            self._queue.extend(events)
+            self.stats['accepted'] += len(events)
+            if was_empty or len(self._queue) >= self.max_batch_size:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Stop accepting events and drain everything still queued."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.error("Ingest buffer did not drain within %.1fs; %d events pending",
+                             timeout, self.pending())
+        else:
+            self._drain()
+        logger.info("Ingest buffer closed: %s", self.stats)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Block until a batch is due, then pop it. Returns [] once closed and empty."""
+        with self._cond:
+            while True:
+                if self._queue:
+                    if self._closed or len(self._queue) >= self.max_batch_size:
+                        break
+                    age = time.monotonic() - self._arrivals[0][0]
+                    if age >= self.max_batch_age:
+                        break
+                    self._cond.wait(self.max_batch_age - age)
+                elif self._closed:
+                    return []
+                else:
+                    self._cond.wait()
+
+            size = min(self.max_batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(size)]
+            # Events left behind keep their own enqueue time, so their age is not reset
+            while size:
+                taken = min(size, self._arrivals[0][1])
+                self._arrivals[0][1] -= taken
+                size -= taken
+                if not self._arrivals[0][1]:
+                    self._arrivals.popleft()
+            return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for attempt in range(1, self.flush_retries + 1):
+            try:
+                self.sink(batch)
+                self.stats['flushed'] += len(batch)
+                self.stats['batches'] += 1
+                return
+            except Exception as e:
+                logger.error("Ingest flush of %d events failed (attempt %d/%d): %s",
+                             len(batch), attempt, self.flush_retries, str(e))
+                if attempt < self.flush_retries:
+                    time.sleep(self.retry_backoff * attempt)
+        self.stats['dropped'] += len(batch)
+        logger.error("Dropped %d events after %d failed flush attempts", len(batch), self.flush_retries)
+
+    def _drain(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def _run(self):
+        self._drain()
@@ -0,0 +1,134 @@
+from typing import List, Dict, Any, Iterator, Tuple, Callable, Optional, BinaryIO
+import json
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+MAX_LINE_BYTES = 8 * 1024 * 1024
+REQUIRED_FIELDS = ('timestamp', 'path', 'method')
+
+
+class UnsupportedEncodingError(ValueError):
+    """Raised for a content encoding the ingest path cannot decode."""
+
+
+def open_decoded(stream: BinaryIO, encoding: Optional[str] = None) -> BinaryIO:
+    """Wrap a binary stream so reads return decompressed bytes.
+
+    encoding is a Content-Encoding value (identity, gzip or zstd). zstd
+    support needs the optional zstandard package.
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding in ('identity', ''):
+        return stream
+    if encoding in ('gzip', 'x-gzip'):
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if encoding == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise UnsupportedEncodingError("zstd encoding requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise UnsupportedEncodingError(f"Unsupported content encoding: {encoding}")
+
+
+def iter_lines(stream: BinaryIO, read_size: int = READ_SIZE,
+               max_line_bytes: int = MAX_LINE_BYTES) -> Iterator[Tuple[int, Optional[bytes]]]:
+    """Yield (line_number, line) pairs from a binary stream.
+
+    Only one read buffer plus the current partial line is held in memory.
+    Lines longer than max_line_bytes are yielded as None so the caller can
+    report them without buffering the whole line.
+    """
+    pending = b''
+    line_no = 0
+    oversized = False
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            break
+        pending += chunk
+        start = 0
+        while True:
+            end = pending.find(b'\n', start)
+            if end < 0:
+                break
+            line_no += 1
+            yield line_no, (None if oversized else pending[start:end])
+            oversized = False
+            start = end + 1
+        pending = pending[start:]
+        if len(pending) > max_line_bytes:
+            oversized = True
+            pending = b''
+    if pending or oversized:
+        line_no += 1
+        yield line_no, (None if oversized else pending)
+
+
+def parse_event(line: bytes) -> Dict[str, Any]:
+    """Decode and validate one NDJSON event line; raises ValueError."""
+    event = json.loads(line)
+    if not isinstance(event, dict):
+        raise ValueError("Event must be a JSON object")
+    missing = [f for f in REQUIRED_FIELDS if event.get(f) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    if not isinstance(event['timestamp'], (int, float)) or isinstance(event['timestamp'], bool):
+        raise ValueError("timestamp must be a unix epoch number")
+    if not isinstance(event['path'], str) or not isinstance(event['method'], str):
+        raise ValueError("path and method must be strings")
+    return event
+
+
+def ingest_lines(lines: Iterator[Tuple[int, Optional[bytes]]], sink: Callable[[List[Dict[str, Any]]], Any],
+                 chunk_size: int = 1000, max_errors: int = 100) -> Dict[str, Any]:
+    """Parse NDJSON lines and hand valid events to sink in bounded chunks.
+
+    Bad lines are skipped and reported individually (up to max_errors
+    entries); a failing chunk is reported as a line range.
+    """
+    report = {'lines': 0, 'stored': 0, 'rejected': 0, 'errors': []}
+    chunk: List[Dict[str, Any]] = []
+    chunk_first_line = 0
+
+    def add_error(line, message):
+        report['rejected'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({'line': line, 'error': message})
+
+    def flush(last_line):
+        try:
+            sink(chunk)
+            report['stored'] += len(chunk)
+        except Exception as e:
+            logger.error("Failed to store NDJSON lines %d-%d: %s", chunk_first_line, last_line, str(e))
+            report['rejected'] += len(chunk)
+            if len(report['errors']) < max_errors:
+                report['errors'].append({'line': chunk_first_line, 'to_line': last_line, 'error': str(e)})
+
+    line_no = 0
+    for line_no, line in lines:
+        if line is None:
+            report['lines'] += 1
+            add_error(line_no, "Line exceeds maximum length")
+            continue
+        if not line.strip():
+            continue
+        report['lines'] += 1
+        try:
+            event = parse_event(line)
+        except ValueError as e:
+            add_error(line_no, str(e))
+            continue
+        if not chunk:
+            chunk_first_line = line_no
+        chunk.append(event)
+        if len(chunk) >= chunk_size:
+            flush(line_no)
+            chunk = []
+    if chunk:
+        flush(line_no)
+    return report
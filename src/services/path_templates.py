@@ -0,0 +1,115 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARAM = '{param}'
+# traffic_events.path_template and endpoints.path are VARCHAR(255)
+MAX_TEMPLATE_LENGTH = 255
+
+NUMERIC_RE = re.compile(r'^\d+$')
+UUID_RE = re.compile(r'^[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}$')
+HEX_HASH_RE = re.compile(r'^[0-9a-fA-F]{16,}$')
+# Long opaque tokens (base64/base62 ids, slugs with embedded ids)
+TOKEN_RE = re.compile(r'^(?=.*\d)(?=.*[A-Za-z])[A-Za-z0-9_\-=]{20,}$')
+
+
+def is_param_segment(segment: str) -> bool:
+    """True for path segments that look like identifiers rather than route names."""
+    return bool(
+        NUMERIC_RE.match(segment)
+        or UUID_RE.match(segment)
+        or HEX_HASH_RE.match(segment)
+        or TOKEN_RE.match(segment)
+    )
+
+
+class PathTemplater:
+    """Collapses concrete request paths into endpoint templates.
+
+    /users/123/orders/456 becomes /users/{param}/orders/{param}, with
+    path params {"users": "123", "orders": "456"}. Numeric, UUID and hash
+    segments are always collapsed. Other segments are learned: once more
+    than learn_threshold distinct values have been seen at the same
+    position under the same template prefix, that position is treated as a
+    parameter from then on. The first segment is never learned, so
+    top-level route names are kept as they are. Templates longer than
+    MAX_TEMPLATE_LENGTH (collapsing short ids to {param} can lengthen a
+    path) are cut back to the last whole segment that fits.
+    """
+
+    def __init__(self, learn_threshold: int = 100, max_tracked_prefixes: int = 10000):
+        self.learn_threshold = learn_threshold
+        self.max_tracked_prefixes = max_tracked_prefixes
+        self._values: Dict[Tuple[str, ...], Set[str]] = {}
+        self._variable: Set[Tuple[str, ...]] = set()
+        self._lock = threading.Lock()
+
+    def seed(self, templates: Iterable[str]):
+        """Mark parameter positions found in previously stored templates as variable."""
+        with self._lock:
+            for template in templates:
+                prefix: Tuple[str, ...] = ()
+                for segment in template.strip('/').split('/'):
+                    if segment == PARAM:
+                        self._variable.add(prefix)
+                    prefix += (segment,)
+
+    def _observe(self, prefix: Tuple[str, ...], segment: str) -> bool:
+        """Record a literal segment; returns True if the position is now variable."""
+        if prefix in self._variable:
+            return True
+        with self._lock:
+            values = self._values.get(prefix)
+            if values is None:
+                if len(self._values) >= self.max_tracked_prefixes:
+                    return False
+                values = self._values[prefix] = set()
+            values.add(segment)
+            if len(values) > self.learn_threshold:
+                self._variable.add(prefix)
+                del self._values[prefix]
+                logger.info("Learned path parameter at /%s/%s", '/'.join(prefix), PARAM)
+                return True
+        return False
+
+    def template(self, path: str) -> Tuple[str, Dict[str, str]]:
+        """Return (template, path_params) for a concrete path."""
+        raw = path.split('?', 1)[0]
+        segments = raw.strip('/').split('/') if raw.strip('/') else []
+        prefix: Tuple[str, ...] = ()
+        params: Dict[str, str] = {}
+        for index, segment in enumerate(segments):
+            if segment and (is_param_segment(segment) or (prefix and self._observe(prefix, segment))):
+                name = prefix[-1] if prefix and prefix[-1] != PARAM else f'param{index}'
+                if name in params:
+                    name = f'{name}_{index}'
+                params[name] = segment
+                segment = PARAM
+            prefix += (segment,)
+        template = '/' + '/'.join(prefix)
+        if raw.endswith('/') and len(raw) > 1:
+            template += '/'
+        if len(template) > MAX_TEMPLATE_LENGTH:
+            template = template[:MAX_TEMPLATE_LENGTH + 1].rsplit('/', 1)[0] or '/'
+        return template, params
+
+    def apply(self, event: Dict) -> Dict:
+        """Annotate an event with path_template and, if missing, extracted path_params."""
+        template, params = self.template(event['path'])
+        event['path_template'] = template
+        if params and not event.get('path_params'):
+            event['path_params'] = params
+        return event
+
+
+def seeded_templater(storage, learn_threshold: int = 100) -> PathTemplater:
+    """PathTemplater seeded with the parameter positions of the storage's endpoint catalog."""
+    templater = PathTemplater(learn_threshold=learn_threshold)
+    try:
+        templater.seed(e['url'] for e in storage.get_available_endpoints())
+    except Exception as e:
+        logger.warning(f"Could not seed path templates from endpoint catalog: {str(e)}")
+    return templater
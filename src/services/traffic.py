@@ -1,12 +1,29 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from ..storage.base import StorageBackend
+from .path_templates import PathTemplater
 
 class TrafficService:
-    def __init__(self, storage: StorageBackend):
+    def __init__(self, storage: StorageBackend, bulk_insert: bool = True, chunk_size: Optional[int] = None,
+                 templater: Optional[PathTemplater] = None):
         self.storage = storage
+        self.bulk_insert = bulk_insert
+        self.chunk_size = chunk_size
+        self.templater = templater or PathTemplater()
+
+    def _annotate(self, events: List[Dict[str, Any]]):
+        for event in events:
+            self.templater.apply(event)
 
     def store_events(self, events: List[Dict[str, Any]]):
+        self._annotate(events)
+        if self.bulk_insert:
+            return self.storage.store_events_bulk(events, chunk_size=self.chunk_size)
         return self.storage.store_events(events)
 
+    def load_events(self, events: List[Dict[str, Any]]):
+        """Offline load path using LOAD DATA LOCAL INFILE (MySQL only)."""
+        self._annotate(events)
+        return self.storage.load_events_infile(events)
+
     def get_analytics(self, start_time, end_time, path_pattern=None):
-        return self.storage.get_analytics(start_time, end_time, path_pattern)
\ No newline at end of file
+        return self.storage.get_analytics(start_time, end_time, path_pattern)
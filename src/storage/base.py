@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 
 class StorageBackend(ABC):
@@ -7,6 +7,11 @@ class StorageBackend(ABC):
     def store_events(self, events: List[Dict[str, Any]]):
         pass
 
+    def store_events_bulk(self, events: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Bulk ingest path. Backends without a faster path fall back to store_events."""
+        self.store_events(events)
+        return {'rows': len(events)}
+
     @abstractmethod
     def get_analytics(self, start_time, end_time, path_pattern=None):
         pass
@@ -1,40 +1,296 @@
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from sqlalchemy import create_engine, select, distinct, and_, text
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Set, Tuple
+import base64
+import json
+import os
+import tempfile
+import time
+from sqlalchemy import create_engine, select, and_, or_, text, insert, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.orm import sessionmaker
 from .base import StorageBackend
-from ..models import TrafficEvent, RequestAnomaly, EndpointTestSuite, TestCase
+from ..models import TrafficEvent, Endpoint, RequestAnomaly, AnomalyRollup, GenerationCacheEntry, RequestPattern, EndpointTestSuite, TestCase
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_INSERT_CHUNK_SIZE = 1000
+
+TRAFFIC_EVENT_COLUMNS = (
+    'timestamp', 'path', 'path_template', 'method', 'headers', 'path_params', 'query_params',
+    'request_body', 'status', 'duration_ms', 'response_headers'
+)
+JSON_EVENT_COLUMNS = {'headers', 'path_params', 'query_params', 'request_body', 'response_headers'}
+
+DEFAULT_FETCH_CHUNK_SIZE = 2000
+
+ANOMALY_UPDATE_COLUMNS = ('similarity_score', 'description', 'reference_events')
+
+DEFAULT_ANOMALY_PAGE_SIZE = 500
+
+# anomaly_rollups buckets similarity scores into deciles
+SCORE_BUCKETS = 10
+ROLLUP_DIMENSIONS = {
+    'hour': ('hour',),
+    'endpoint': ('path', 'method'),
+    'anomaly_type': ('anomaly_type',)
+}
+
+# Fields of get_anomalies/iter_anomalies rows; a projection is a subset like ['anomaly.id', 'event.path']
+ANOMALY_FIELDS = ('id', 'event_id', 'similarity_score', 'anomaly_type', 'description', 'detected_at',
+                  'reference_events')
+ANOMALY_EVENT_FIELDS = ('id', 'timestamp', 'path', 'method', 'headers', 'path_params', 'query_params',
+                        'request_body', 'status', 'duration_ms', 'response_headers')
+
+# Columns analysis needs; the response side and path params are never loaded
+ANALYSIS_EVENT_COLUMNS = (
+    'id', 'timestamp', 'path', 'method', 'request_body', 'query_params', 'headers', 'status', 'duration_ms'
+)
+
+
+def _event_to_row(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an incoming event payload to a traffic_events column dict."""
+    return {
+        'timestamp': datetime.fromtimestamp(event_data['timestamp']),
+        'path': event_data['path'],
+        'path_template': event_data.get('path_template') or event_data['path'],
+        'method': event_data['method'],
+        'headers': event_data.get('headers'),
+        'path_params': event_data.get('path_params'),
+        'query_params': event_data.get('query_params'),
+        'request_body': event_data.get('request_body'),
+        'status': event_data.get('status'),
+        'duration_ms': event_data.get('duration_ms'),
+        'response_headers': event_data.get('response_headers')
+    }
+
+
+def _compact_json(value: Any) -> str:
+    """JSON column serializer without the default ', ' / ': ' padding."""
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _anomaly_to_row(anomaly: Any) -> Dict[str, Any]:
+    """Map an AnomalyResult-like object to a request_anomalies column dict."""
+    return {
+        'event_id': anomaly.event_id,
+        'similarity_score': anomaly.similarity_score,
+        'anomaly_type': anomaly.anomaly_type,
+        'description': anomaly.description,
+        'reference_events': anomaly.reference_events
+    }
+
+
+def _reference_payload(reference: Dict[str, Any], event: Optional[TrafficEvent]) -> Dict[str, Any]:
+    """Expand a stored {id, similarity} reference with its event's fields."""
+    if event is None:
+        return dict(reference)
+    return {
+        'id': event.id,
+        'timestamp': event.timestamp.isoformat(),
+        'path': event.path,
+        'path_template': event.path_template,
+        'method': event.method,
+        'request_body': event.request_body,
+        'status': str(event.status),
+        'similarity': reference.get('similarity')
+    }
+
+
+def parse_anomaly_fields(fields: Optional[Sequence[str]]) -> Dict[str, Tuple[str, ...]]:
+    """Resolve a field projection into the anomaly and event fields to return.
+
+    Each entry is 'anomaly.<field>', 'event.<field>' or a whole section
+    ('anomaly' / 'event'); None selects everything. Raises ValueError for
+    unknown fields.
+    """
+    available = {'anomaly': ANOMALY_FIELDS, 'event': ANOMALY_EVENT_FIELDS}
+    if not fields:
+        return dict(available)
+    selected: Dict[str, List[str]] = {'anomaly': [], 'event': []}
+    for entry in fields:
+        section, _, name = entry.strip().partition('.')
+        if section not in available or (name and name not in available[section]):
+            raise ValueError(f"Unknown anomaly field: {entry!r}")
+        for field in ([name] if name else available[section]):
+            if field not in selected[section]:
+                selected[section].append(field)
+    return {section: tuple(names) for section, names in selected.items()}
+
+
+def encode_anomaly_cursor(detected_at: datetime, anomaly_id: int) -> str:
+    """Opaque keyset cursor for the anomaly after which the next page starts."""
+    raw = _compact_json([detected_at.isoformat(), anomaly_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_anomaly_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        detected_at, anomaly_id = json.loads(raw)
+        return datetime.fromisoformat(detected_at), int(anomaly_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _format_anomaly_value(field: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if field in ('detected_at', 'timestamp'):
+        return value.isoformat()
+    if field in ('similarity_score', 'duration_ms'):
+        return float(value)
+    return value
+
+
+def _rollup_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _score_bucket(score: Optional[float]) -> int:
+    return min(max(int((score or 0.0) * SCORE_BUCKETS), 0), SCORE_BUCKETS - 1)
+
+
+def _infile_value(column: str, value: Any) -> str:
+    """Encode a value for a tab-separated LOAD DATA file (\\N is NULL)."""
+    if value is None:
+        return '\\N'
+    if column in JSON_EVENT_COLUMNS:
+        value = _compact_json(value)
+    elif isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def _upsert_endpoint_catalog(conn, rows: List[Dict[str, Any]]):
+    """Fold a batch of traffic_events rows into the endpoints catalog."""
+    seen: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row['path_template'], row['method'])
+        entry = seen.get(key)
+        if entry is None:
+            seen[key] = {
+                'path': row['path_template'],
+                'method': row['method'],
+                'first_seen': row['timestamp'],
+                'last_seen': row['timestamp'],
+                'hit_count': 1
+            }
+        else:
+            entry['first_seen'] = min(entry['first_seen'], row['timestamp'])
+            entry['last_seen'] = max(entry['last_seen'], row['timestamp'])
+            entry['hit_count'] += 1
+    if not seen:
+        return
+
+    table = Endpoint.__table__
+    # Sorted so concurrent writers lock catalog rows in the same order
+    stmt = mysql_insert(table).values([seen[key] for key in sorted(seen)])
+    stmt = stmt.on_duplicate_key_update(
+        first_seen=func.least(table.c.first_seen, stmt.inserted.first_seen),
+        last_seen=func.greatest(table.c.last_seen, stmt.inserted.last_seen),
+        hit_count=table.c.hit_count + stmt.inserted.hit_count
+    )
+    conn.execute(stmt)
+
+
 class MySQLStorage(StorageBackend):
-    def __init__(self, connection_uri: str):
-        self.engine = create_engine(connection_uri)
+    def __init__(self, connection_uri: str, insert_chunk_size: int = DEFAULT_INSERT_CHUNK_SIZE,
+                 local_infile: bool = False):
+        connect_args = {'local_infile': True} if local_infile else {}
+        self.engine = create_engine(connection_uri, connect_args=connect_args, json_serializer=_compact_json)
+        self.local_infile = local_infile
         self.Session = sessionmaker(bind=self.engine)
+        self.insert_chunk_size = insert_chunk_size
 
     def store_events(self, events: List[Dict[str, Any]]):
         session = self.Session()
         try:
-            for event_data in events:
-                event = TrafficEvent(
-                    timestamp=datetime.fromtimestamp(event_data['timestamp']),
-                    path=event_data['path'],
-                    method=event_data['method'],
-                    headers=event_data.get('headers'),
-                    path_params=event_data.get('path_params'),
-                    query_params=event_data.get('query_params'),
-                    request_body=event_data.get('request_body'),
-                    status=event_data.get('status'),
-                    duration_ms=event_data.get('duration_ms'),
-                    response_headers=event_data.get('response_headers')
-                )
-                session.add(event)
+            rows = [_event_to_row(event_data) for event_data in events]
+            for row in rows:
+                session.add(TrafficEvent(**row))
+            _upsert_endpoint_catalog(session, rows)
             session.commit()
         finally:
             session.close()
 
+    def store_events_bulk(self, events: List[Dict[str, Any]], chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Insert events with chunked multi-row INSERTs, bypassing the ORM.
+
+        All chunks are written in a single transaction. Returns the number of
+        rows written and the observed throughput.
+        """
+        chunk_size = chunk_size or self.insert_chunk_size
+        table = TrafficEvent.__table__
+        started = time.perf_counter()
+        rows_written = 0
+
+        with self.engine.begin() as conn:
+            for offset in range(0, len(events), chunk_size):
+                rows = [_event_to_row(e) for e in events[offset:offset + chunk_size]]
+                conn.execute(insert(table).values(rows))
+                _upsert_endpoint_catalog(conn, rows)
+                rows_written += len(rows)
+
+        elapsed = time.perf_counter() - started
+        rows_per_sec = rows_written / elapsed if elapsed > 0 else 0.0
+        logger.info("Bulk inserted %d events in %.3fs (%.0f rows/sec, chunk_size=%d)",
+                    rows_written, elapsed, rows_per_sec, chunk_size)
+        return {
+            'rows': rows_written,
+            'seconds': elapsed,
+            'rows_per_sec': rows_per_sec
+        }
+
+    def supports_local_infile(self) -> bool:
+        """True when both the client connection and the server allow LOAD DATA LOCAL."""
+        if not self.local_infile:
+            return False
+        try:
+            with self.engine.connect() as conn:
+                return bool(int(conn.execute(text("SELECT @@GLOBAL.local_infile")).scalar() or 0))
+        except Exception as e:
+            logger.warning("Could not check local_infile support: %s", str(e))
+            return False
+
+    def load_events_infile(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Load events with LOAD DATA LOCAL INFILE from a temporary TSV file."""
+        started = time.perf_counter()
+        fd, tmp_path = tempfile.mkstemp(prefix='traffic_events_', suffix='.tsv')
+        try:
+            rows = [_event_to_row(event_data) for event_data in events]
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                for row in rows:
+                    f.write('\t'.join(_infile_value(c, row[c]) for c in TRAFFIC_EVENT_COLUMNS))
+                    f.write('\n')
+
+            statement = (
+                f"LOAD DATA LOCAL INFILE '{tmp_path}' INTO TABLE traffic_events "
+                "CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+                "LINES TERMINATED BY '\\n' "
+                f"({', '.join(TRAFFIC_EVENT_COLUMNS)})"
+            )
+            with self.engine.begin() as conn:
+                rows_written = conn.exec_driver_sql(statement).rowcount
+                _upsert_endpoint_catalog(conn, rows)
+        finally:
+            os.unlink(tmp_path)
+
+        elapsed = time.perf_counter() - started
+        rows_per_sec = rows_written / elapsed if elapsed > 0 else 0.0
+        logger.info("Loaded %d events via LOAD DATA in %.3fs (%.0f rows/sec)",
+                    rows_written, elapsed, rows_per_sec)
+        return {
+            'rows': rows_written,
+            'seconds': elapsed,
+            'rows_per_sec': rows_per_sec
+        }
+
     def get_analytics(self, start_time, end_time, path_pattern=None):
         session = self.Session()
         try:
@@ -48,100 +304,427 @@ class MySQLStorage(StorageBackend):
         finally:
             session.close()
 
-    async def get_events_by_endpoint(self, path: str, method: str, start_time: datetime, end_time: datetime):
+    async def iter_events_by_endpoint(self, path: str, method: str, start_time: datetime, end_time: datetime,
+                                      after_id: Optional[int] = None, chunk_size: int = DEFAULT_FETCH_CHUNK_SIZE):
+        """Stream an endpoint's events as lists of at most chunk_size rows.
+
+        Rows carry only ANALYSIS_EVENT_COLUMNS (as attributes). Each chunk is
+        its own keyset query on (timestamp, id), which walks the
+        (path_template, method, timestamp) index in order, and the
+        connection is returned to the pool before the chunk is yielded.
+        Callers can therefore await other storage calls between chunks
+        without holding a connection. With after_id only events with a
+        larger id are returned.
+        """
+        stmt = (
+            select(*(getattr(TrafficEvent, column) for column in ANALYSIS_EVENT_COLUMNS))
+            .where(
+                and_(
+                    TrafficEvent.path_template == path,
+                    TrafficEvent.method == method,
+                    TrafficEvent.timestamp.between(start_time, end_time)
+                )
+            )
+            .order_by(TrafficEvent.timestamp, TrafficEvent.id)
+            .limit(chunk_size)
+        )
+        if after_id is not None:
+            stmt = stmt.where(TrafficEvent.id > after_id)
+        last = None
+        while True:
+            page = stmt
+            if last is not None:
+                page = page.where(or_(
+                    TrafficEvent.timestamp > last.timestamp,
+                    and_(TrafficEvent.timestamp == last.timestamp, TrafficEvent.id > last.id)
+                ))
+            with self.engine.connect() as conn:
+                rows = conn.execute(page).all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1]
+
+    async def get_settled_event_id(self, path: str, method: str, start_time: datetime, settled_before: datetime,
+                                   after_id: Optional[int] = None) -> Optional[int]:
+        """Highest event id an analysis watermark can safely advance to, or None.
+
+        Ids are allocated at insert but become visible at commit, so an
+        event committed late can carry a lower id than events already seen.
+        Only events with a timestamp before settled_before count as settled,
+        and the result stays below the first unsettled id, so an event still
+        in flight below that id is scanned again by the next run.
+        """
+        endpoint = and_(TrafficEvent.path_template == path, TrafficEvent.method == method)
+        if after_id is not None:
+            endpoint = and_(endpoint, TrafficEvent.id > after_id)
+        with self.engine.connect() as conn:
+            first_unsettled = conn.execute(
+                select(func.min(TrafficEvent.id)).where(endpoint, TrafficEvent.timestamp >= settled_before)
+            ).scalar()
+            stmt = select(func.max(TrafficEvent.id)).where(
+                endpoint, TrafficEvent.timestamp >= start_time, TrafficEvent.timestamp < settled_before
+            )
+            if first_unsettled is not None:
+                stmt = stmt.where(TrafficEvent.id < first_unsettled)
+            return conn.execute(stmt).scalar()
+
+    async def get_existing_event_ids(self, event_ids: List[int]) -> Set[int]:
+        """The subset of event_ids still present, from a single id-only IN query."""
+        if not event_ids:
+            return set()
+        with self.engine.connect() as conn:
+            return set(conn.execute(
+                select(TrafficEvent.id).where(TrafficEvent.id.in_(set(int(i) for i in event_ids)))
+            ).scalars())
+
+    def _events_by_ids(self, event_ids) -> List[TrafficEvent]:
+        if not event_ids:
+            return []
         session = self.Session()
         try:
-            query = (
+            return (
                 session.query(TrafficEvent)
-                .filter(
-                    and_(
-                        TrafficEvent.path == path,
-                        TrafficEvent.method == method,
-                        TrafficEvent.timestamp.between(start_time, end_time)
-                    )
-                )
+                .filter(TrafficEvent.id.in_(set(int(i) for i in event_ids)))
+                .all()
             )
-            return query.all()
         finally:
             session.close()
 
+    def _hydrate_reference_lists(self, reference_lists) -> List[List[Dict[str, Any]]]:
+        reference_lists = [references or [] for references in reference_lists]
+        event_ids = {
+            reference['id'] for references in reference_lists for reference in references
+            if 'path' not in reference and reference.get('id') is not None
+        }
+        events = {event.id: event for event in self._events_by_ids(event_ids)}
+        return [
+            [
+                reference if 'path' in reference else _reference_payload(reference, events.get(reference.get('id')))
+                for reference in references
+            ]
+            for references in reference_lists
+        ]
+
+    async def hydrate_references(self, reference_lists: List[Optional[List[Dict[str, Any]]]]) -> List[List[Dict[str, Any]]]:
+        """Expand anomalies' stored references into event payloads with one IN query.
+
+        Stored references are {id, similarity} pairs. References whose event
+        no longer exists keep only those two keys, and rows written before
+        references were stored by id are returned unchanged.
+        """
+        return self._hydrate_reference_lists(reference_lists)
+
+    async def get_request_pattern(self, path: str, method: str) -> Optional[Dict[str, Any]]:
+        """Return the stored pattern_vector, baseline and analysis watermark for an endpoint, if any."""
+        session = self.Session()
+        try:
+            pattern = session.query(RequestPattern).filter(
+                and_(
+                    RequestPattern.path == path,
+                    RequestPattern.method == method
+                )
+            ).first()
+            if not pattern:
+                return None
+            return {
+                'pattern_vector': pattern.pattern_vector,
+                'baseline': pattern.baseline,
+                'last_event_id': pattern.last_event_id
+            }
+        finally:
+            session.close()
+
+    async def save_request_pattern(self, path: str, method: str, pattern_vector: Optional[Dict[str, Any]] = None,
+                                   last_event_id: Optional[int] = None, baseline: Optional[Dict[str, Any]] = None):
+        """Upsert an endpoint's pattern_vector and/or baseline, and/or advance its watermark.
+
+        None leaves the stored value untouched; the watermark never moves back.
+        """
+        table = RequestPattern.__table__
+        stmt = mysql_insert(table).values(
+            path=path, method=method, pattern_vector=pattern_vector, last_event_id=last_event_id, baseline=baseline
+        )
+        updates = {}
+        if pattern_vector is not None:
+            updates['pattern_vector'] = stmt.inserted.pattern_vector
+        if baseline is not None:
+            updates['baseline'] = stmt.inserted.baseline
+        if last_event_id is not None:
+            updates['last_event_id'] = func.greatest(
+                func.coalesce(table.c.last_event_id, 0), stmt.inserted.last_event_id
+            )
+        if not updates:
+            return
+        stmt = stmt.on_duplicate_key_update(**updates)
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
     async def store_anomaly(self, event_id: int, similarity_score: float, 
                           anomaly_type: str, description: str, reference_events: List[Dict]):
+        """Store an anomaly; re-scoring the same event updates the existing row."""
+        table = RequestAnomaly.__table__
+        stmt = mysql_insert(table).values(
+            event_id=event_id,
+            similarity_score=similarity_score,
+            anomaly_type=anomaly_type,
+            description=description,
+            reference_events=reference_events
+        )
+        stmt = stmt.on_duplicate_key_update(
+            similarity_score=stmt.inserted.similarity_score,
+            description=stmt.inserted.description,
+            reference_events=stmt.inserted.reference_events
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    async def store_anomalies(self, anomalies: List[Any], chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """Upsert anomalies (AnomalyResult-like objects) with chunked multi-row INSERTs.
+
+        All chunks are written in a single transaction, so an endpoint's or a
+        whole run's results land together. Re-scoring an event updates its
+        existing row. anomaly_rollups is updated in the same transaction for
+        anomalies that carry their endpoint's path and method. Returns the
+        number of rows written and the throughput.
+        """
+        if not anomalies:
+            return {'rows': 0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+        chunk_size = chunk_size or self.insert_chunk_size
+        table = RequestAnomaly.__table__
+        started = time.perf_counter()
+        # detected_at is a TIMESTAMP without fractions; MySQL would round microseconds, possibly into
+        # the next hour, and the row would no longer match the rollup hour counted below
+        detected_at = datetime.now().replace(microsecond=0)
+        # One row per (event_id, anomaly_type); the last result wins, as with row-by-row upserts
+        latest = {(anomaly.event_id, anomaly.anomaly_type): anomaly for anomaly in anomalies}
+        keys = list(latest)
+
+        with self.engine.begin() as conn:
+            for offset in range(0, len(keys), chunk_size):
+                chunk = keys[offset:offset + chunk_size]
+                rollups = self._rollup_deltas(conn, [latest[key] for key in chunk], detected_at)
+                rows = [dict(_anomaly_to_row(latest[key]), detected_at=detected_at) for key in chunk]
+                stmt = mysql_insert(table).values(rows)
+                stmt = stmt.on_duplicate_key_update(
+                    **{column: stmt.inserted[column] for column in ANOMALY_UPDATE_COLUMNS}
+                )
+                conn.execute(stmt)
+                if rollups:
+                    stmt = mysql_insert(AnomalyRollup.__table__).values(rollups)
+                    stmt = stmt.on_duplicate_key_update(
+                        anomaly_count=AnomalyRollup.__table__.c.anomaly_count + stmt.inserted.anomaly_count
+                    )
+                    conn.execute(stmt)
+
+        elapsed = time.perf_counter() - started
+        rows_per_sec = len(keys) / elapsed if elapsed > 0 else 0.0
+        logger.debug("Stored %d anomalies in %.3fs (%.0f rows/sec, chunk_size=%d)",
+                     len(keys), elapsed, rows_per_sec, chunk_size)
+        return {
+            'rows': len(keys),
+            'seconds': elapsed,
+            'rows_per_sec': rows_per_sec
+        }
+
+    def _rollup_deltas(self, conn, anomalies: List[Any], detected_at: datetime) -> List[Dict[str, Any]]:
+        """Rollup count changes for upserting anomalies.
+
+        New anomalies count once in the current hour. A re-scored anomaly
+        keeps its detected_at hour and only moves between score buckets. The
+        existing rows are locked until the transaction ends, so concurrent
+        writers cannot count them twice.
+        """
+        anomalies = [anomaly for anomaly in anomalies if getattr(anomaly, 'path', None)]
+        if not anomalies:
+            return []
+        existing = {
+            (row.event_id, row.anomaly_type): row
+            for row in conn.execute(
+                select(RequestAnomaly.event_id, RequestAnomaly.anomaly_type,
+                       RequestAnomaly.detected_at, RequestAnomaly.similarity_score)
+                .where(RequestAnomaly.event_id.in_({anomaly.event_id for anomaly in anomalies}))
+                .with_for_update()
+            )
+        }
+        deltas = Counter()
+        for anomaly in anomalies:
+            endpoint = (anomaly.path, anomaly.method, anomaly.anomaly_type)
+            previous = existing.get((anomaly.event_id, anomaly.anomaly_type))
+            if previous is None:
+                deltas[(_rollup_hour(detected_at),) + endpoint + (_score_bucket(anomaly.similarity_score),)] += 1
+                continue
+            hour = _rollup_hour(previous.detected_at)
+            deltas[(hour,) + endpoint + (_score_bucket(previous.similarity_score),)] -= 1
+            deltas[(hour,) + endpoint + (_score_bucket(anomaly.similarity_score),)] += 1
+        return [
+            {'hour': hour, 'path': path, 'method': method, 'anomaly_type': anomaly_type,
+             'score_bucket': bucket, 'anomaly_count': count}
+            for (hour, path, method, anomaly_type, bucket), count in deltas.items() if count
+        ]
+
+    async def get_anomaly_summary(self, hours: int = 24, group_by: Sequence[str] = ('hour', 'endpoint', 'anomaly_type'),
+                                  top: int = 10, path: Optional[str] = None,
+                                  method: Optional[str] = None) -> Dict[str, Any]:
+        """Anomaly counts from anomaly_rollups, never touching raw anomaly rows.
+
+        Returns counts grouped by any of 'hour', 'endpoint' and
+        'anomaly_type', a similarity-score histogram in deciles and the top
+        endpoints by anomaly count. The window starts at the beginning of
+        the hour `hours` ago. Raises ValueError for an unknown group.
+        """
+        unknown = set(group_by) - set(ROLLUP_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown summary group: {', '.join(sorted(unknown))}")
+        columns = [getattr(AnomalyRollup, name) for group in group_by for name in ROLLUP_DIMENSIONS[group]]
+        count = func.sum(AnomalyRollup.anomaly_count)
+        conditions = [AnomalyRollup.hour >= _rollup_hour(datetime.now() - timedelta(hours=hours))]
+        if path:
+            conditions.append(AnomalyRollup.path == path)
+        if method:
+            conditions.append(AnomalyRollup.method == method)
+
         session = self.Session()
         try:
-            anomaly = RequestAnomaly(
-                event_id=event_id,
-                similarity_score=similarity_score,
-                anomaly_type=anomaly_type,
-                description=description,
-                reference_events=reference_events
-            )
-            session.add(anomaly)
-            session.commit()
+            groups = session.execute(
+                select(*columns, count.label('count')).where(*conditions)
+                .group_by(*columns).order_by(*columns)
+            ).all() if columns else []
+            buckets = dict(session.execute(
+                select(AnomalyRollup.score_bucket, count).where(*conditions).group_by(AnomalyRollup.score_bucket)
+            ).all())
+            top_endpoints = session.execute(
+                select(AnomalyRollup.path, AnomalyRollup.method, count.label('count')).where(*conditions)
+                .group_by(AnomalyRollup.path, AnomalyRollup.method)
+                .order_by(count.desc()).limit(top)
+            ).all()
         finally:
             session.close()
 
+        def group_entry(row):
+            entry = {name: value for name, value in row._mapping.items() if name != 'count'}
+            if 'hour' in entry:
+                entry['hour'] = entry['hour'].isoformat()
+            entry['count'] = int(row.count)
+            return entry
+
+        histogram = [
+            {'min_score': bucket / SCORE_BUCKETS, 'max_score': (bucket + 1) / SCORE_BUCKETS,
+             'count': int(buckets.get(bucket) or 0)}
+            for bucket in range(SCORE_BUCKETS)
+        ]
+        return {
+            'hours': hours,
+            'total': sum(entry['count'] for entry in histogram),
+            'groups': [group_entry(row) for row in groups],
+            'score_histogram': histogram,
+            'top_endpoints': [
+                {'path': row.path, 'method': row.method, 'count': int(row.count)} for row in top_endpoints
+            ]
+        }
+
     async def get_unique_endpoints(self, hours: int):
+        """Endpoints seen in the last `hours`, read from the endpoints catalog."""
         session = self.Session()
         try:
             cutoff_time = datetime.now() - timedelta(hours=hours)
             query = (
-                session.query(distinct(TrafficEvent.path), TrafficEvent.method)
-                .filter(TrafficEvent.timestamp >= cutoff_time)
+                session.query(Endpoint.path, Endpoint.method)
+                .filter(Endpoint.last_seen >= cutoff_time)
             )
             return query.all()
         finally:
             session.close()
 
-    async def get_anomalies(self, hours: int = 24, min_score: float = 0.0):
-        session = self.Session()
-        try:
-            cutoff_time = datetime.now() - timedelta(hours=hours)
-            query = (
-                session.query(RequestAnomaly, TrafficEvent)
-                .join(TrafficEvent, RequestAnomaly.event_id == TrafficEvent.id)
-                .filter(
-                    and_(
-                        RequestAnomaly.detected_at >= cutoff_time,
-                        RequestAnomaly.similarity_score >= min_score
-                    )
-                )
-                .order_by(RequestAnomaly.detected_at.desc())
+    async def get_anomalies(self, hours: int = 24, min_score: float = 0.0, hydrate_references: bool = True,
+                            fields: Optional[Sequence[str]] = None, cursor: Optional[str] = None,
+                            limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recent anomalies with their events, newest first.
+
+        See iter_anomalies for the arguments; returns every row up to limit.
+        """
+        rows = []
+        for page, _ in self.iter_anomalies(hours, min_score, hydrate_references, fields, cursor, limit):
+            rows.extend(page)
+        return rows
+
+    def iter_anomalies(self, hours: int = 24, min_score: float = 0.0, hydrate_references: bool = True,
+                       fields: Optional[Sequence[str]] = None, cursor: Optional[str] = None,
+                       limit: Optional[int] = None, page_size: int = DEFAULT_ANOMALY_PAGE_SIZE
+                       ) -> Iterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """Yield (rows, next_cursor) pages of recent anomalies, newest first.
+
+        Pages are fetched with keyset pagination on (detected_at, id), each in
+        its own short query, so no connection is held while a caller streams
+        the rows out. cursor resumes after a previous page. next_cursor is
+        set for every full page, including the one that reaches limit (so a
+        limited request can be continued), and None once a page comes back
+        short because there are no more rows. fields is a projection (see
+        parse_anomaly_fields): only the selected columns are loaded, and
+        references are hydrated only when selected.
+        """
+        selected = parse_anomaly_fields(fields)
+        columns = [RequestAnomaly.id.label('_id'), RequestAnomaly.detected_at.label('_detected_at')]
+        columns += [getattr(RequestAnomaly, name).label(f'anomaly.{name}') for name in selected['anomaly']]
+        columns += [getattr(TrafficEvent, name).label(f'event.{name}') for name in selected['event']]
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        base = (
+            select(*columns)
+            .join(TrafficEvent, RequestAnomaly.event_id == TrafficEvent.id)
+            .where(
+                RequestAnomaly.detected_at >= cutoff_time,
+                RequestAnomaly.similarity_score >= min_score
             )
-            results = query.all()
-            
-            # Convert the results to a JSON-serializable format
-            formatted_results = []
-            for anomaly, event in results:
-                formatted_results.append({
-                    'anomaly': {
-                        'id': anomaly.id,
-                        'event_id': anomaly.event_id,
-                        'similarity_score': float(anomaly.similarity_score),
-                        'anomaly_type': anomaly.anomaly_type,
-                        'description': anomaly.description,
-                        'detected_at': anomaly.detected_at.isoformat(),
-                        'reference_events': anomaly.reference_events
-                    },
-                    'event': {
-                        'id': event.id,
-                        'timestamp': event.timestamp.isoformat(),
-                        'path': event.path,
-                        'method': event.method,
-                        'headers': event.headers,
-                        'path_params': event.path_params,
-                        'query_params': event.query_params,
-                        'request_body': event.request_body,
-                        'status': event.status,
-                        'duration_ms': float(event.duration_ms) if event.duration_ms else None,
-                        'response_headers': event.response_headers
-                    }
-                })
-            
-            return formatted_results
-        finally:
-            session.close()
-    
+            .order_by(RequestAnomaly.detected_at.desc(), RequestAnomaly.id.desc())
+        )
+        position = decode_anomaly_cursor(cursor) if cursor else None
+        remaining = limit
+
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            stmt = base
+            if position is not None:
+                detected_at, anomaly_id = position
+                stmt = stmt.where(or_(
+                    RequestAnomaly.detected_at < detected_at,
+                    and_(RequestAnomaly.detected_at == detected_at, RequestAnomaly.id < anomaly_id)
+                ))
+            session = self.Session()
+            try:
+                results = session.execute(stmt.limit(size)).all()
+            finally:
+                session.close()
+            if not results:
+                return
+
+            references = None
+            if hydrate_references and 'reference_events' in selected['anomaly']:
+                references = self._hydrate_reference_lists(row._mapping['anomaly.reference_events'] for row in results)
+            page = []
+            for i, row in enumerate(results):
+                values = row._mapping
+                formatted = {}
+                for section, names in selected.items():
+                    if names:
+                        formatted[section] = {
+                            name: _format_anomaly_value(name, values[f'{section}.{name}']) for name in names
+                        }
+                if references is not None:
+                    formatted['anomaly']['reference_events'] = references[i]
+                page.append(formatted)
+
+            last = results[-1]._mapping
+            position = (last['_detected_at'], last['_id'])
+            if remaining is not None:
+                remaining -= len(results)
+            more = len(results) == size and (remaining is None or remaining > 0)
+            next_cursor = encode_anomaly_cursor(*position) if len(results) == size else None
+            yield page, next_cursor
+            if not more:
+                return
+
     async def get_anomalies_by_endpoint(self, hours: int = 24):
         session = self.Session()
         try:
@@ -198,6 +781,59 @@ class MySQLStorage(StorageBackend):
         finally:
             session.close()
 
+    async def get_generation_cache_entry(self, fingerprint: str, min_created_at: datetime) -> Optional[Dict[str, Any]]:
+        """Return a cached generation created after min_created_at, marking it used."""
+        now = datetime.now()
+        table = GenerationCacheEntry.__table__
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.model, table.c.test_cases, table.c.cost)
+                .where(table.c.fingerprint == fingerprint, table.c.created_at >= min_created_at)
+            ).first()
+            if row is None:
+                return None
+            conn.execute(
+                table.update().where(table.c.fingerprint == fingerprint)
+                .values(hits=table.c.hits + 1, last_used_at=now)
+            )
+        return {'model': row.model, 'test_cases': row.test_cases, 'cost': float(row.cost)}
+
+    async def save_generation_cache_entry(self, fingerprint: str, model: str, test_cases: List[Dict[str, Any]],
+                                          cost: float):
+        """Insert or replace a cached generation."""
+        now = datetime.now()
+        stmt = mysql_insert(GenerationCacheEntry.__table__).values(
+            fingerprint=fingerprint, model=model, test_cases=test_cases, cost=cost,
+            hits=0, created_at=now, last_used_at=now
+        )
+        stmt = stmt.on_duplicate_key_update(
+            model=stmt.inserted.model,
+            test_cases=stmt.inserted.test_cases,
+            cost=stmt.inserted.cost,
+            hits=0,
+            created_at=stmt.inserted.created_at,
+            last_used_at=stmt.inserted.last_used_at
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    async def evict_generation_cache(self, min_created_at: datetime, max_entries: int) -> int:
+        """Delete expired entries, then the least recently used beyond max_entries; returns rows deleted."""
+        table = GenerationCacheEntry.__table__
+        with self.engine.begin() as conn:
+            deleted = conn.execute(table.delete().where(table.c.created_at < min_created_at)).rowcount
+            excess = conn.execute(select(func.count()).select_from(table)).scalar() - max_entries
+            if excess > 0:
+                # MySQL cannot LIMIT a subquery on the table being deleted from
+                stale = conn.execute(
+                    select(table.c.fingerprint).order_by(table.c.last_used_at).limit(excess)
+                ).scalars().all()
+                for offset in range(0, len(stale), self.insert_chunk_size):
+                    deleted += conn.execute(
+                        table.delete().where(table.c.fingerprint.in_(stale[offset:offset + self.insert_chunk_size]))
+                    ).rowcount
+        return deleted
+
     def generate_openapi_data(self, base_url: str) -> Dict:
         """Generate OpenAPI-compatible data."""
         session = self.Session()
@@ -307,12 +943,21 @@ class MySQLStorage(StorageBackend):
         finally:
             session.close()
 
-    def get_available_endpoints(self) -> List[Dict[str, str]]:
-        """Get all available endpoints."""
+    def get_available_endpoints(self) -> List[Dict[str, Any]]:
+        """Get all observed endpoints from the endpoints catalog."""
         session = self.Session()
         try:
-            endpoints = session.query(EndpointTestSuite).all()
-            return [{"url": e.url, "http_method": e.http_method} for e in endpoints]
+            endpoints = session.query(Endpoint).order_by(Endpoint.path, Endpoint.method).all()
+            return [
+                {
+                    "url": e.path,
+                    "http_method": e.method,
+                    "first_seen": e.first_seen.isoformat(),
+                    "last_seen": e.last_seen.isoformat(),
+                    "hit_count": e.hit_count
+                }
+                for e in endpoints
+            ]
         finally:
             session.close()
 
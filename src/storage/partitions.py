@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+FUTURE_PARTITION = 'p_future'
+# Partitions added per REORGANIZE PARTITION statement; each statement rewrites p_future
+MAX_PARTITIONS_PER_STATEMENT = 31
+# MySQL TO_DAYS() counts from year 0; Python ordinals count from year 1.
+TO_DAYS_OFFSET = 365
+
+
+def _to_days(day: date) -> int:
+    return day.toordinal() + TO_DAYS_OFFSET
+
+
+def _from_days(days: int) -> date:
+    return date.fromordinal(days - TO_DAYS_OFFSET)
+
+
+def _partition_name(day: date) -> str:
+    return f"p{day.strftime('%Y%m%d')}"
+
+
+class PartitionManager:
+    """Maintains daily RANGE (TO_DAYS(timestamp)) partitions on traffic_events.
+
+    Each daily partition pYYYYMMDD holds that day's events. New days are
+    split out of the trailing p_future partition ahead of time, and expired
+    days are removed with DROP PARTITION instead of row DELETEs.
+    """
+
+    def __init__(self, engine, table: str = 'traffic_events'):
+        self.engine = engine
+        self.table = table
+
+    def list_partitions(self) -> List[Tuple[str, Optional[int]]]:
+        """Return (name, upper bound in TO_DAYS, None for MAXVALUE) in order."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                "ORDER BY PARTITION_ORDINAL_POSITION"
+            ), {'table': self.table}).all()
+        partitions = []
+        for name, description in rows:
+            if name is None:
+                return []
+            bound = None if description == 'MAXVALUE' else int(description)
+            partitions.append((name, bound))
+        return partitions
+
+    def _oldest_future_day(self) -> Optional[date]:
+        with self.engine.connect() as conn:
+            oldest = conn.execute(text(
+                f"SELECT MIN(timestamp) FROM {self.table} PARTITION ({FUTURE_PARTITION})"
+            )).scalar()
+        return oldest.date() if oldest is not None else None
+
+    def ensure_partitions(self, days_ahead: int = 7, today: Optional[date] = None) -> List[str]:
+        """Split p_future so that every day up to today + days_ahead has its own partition.
+
+        Daily partitions start at the oldest row in p_future (at most today),
+        so on a fresh install the days between p_history and today are not
+        created one by one; the first new partition covers that gap. They
+        are added at most MAX_PARTITIONS_PER_STATEMENT per statement.
+        """
+        today = today or datetime.now().date()
+        partitions = self.list_partitions()
+        if not partitions:
+            raise RuntimeError(f"{self.table} is not partitioned; run the partitioning migration first")
+        if partitions[-1] != (FUTURE_PARTITION, None):
+            raise RuntimeError(f"{self.table} must end with a {FUTURE_PARTITION} MAXVALUE partition")
+
+        bounds = [bound for _, bound in partitions if bound is not None]
+        next_day = _from_days(max(bounds)) if bounds else today
+        if next_day < today:
+            next_day = min(self._oldest_future_day() or today, today)
+        last_day = today + timedelta(days=days_ahead)
+        created = []
+        definitions = []
+        while next_day <= last_day:
+            name = _partition_name(next_day)
+            definitions.append(
+                f"PARTITION {name} VALUES LESS THAN ({_to_days(next_day + timedelta(days=1))})"
+            )
+            created.append(name)
+            next_day += timedelta(days=1)
+
+        if not definitions:
+            return []
+        for start in range(0, len(definitions), MAX_PARTITIONS_PER_STATEMENT):
+            step = definitions[start:start + MAX_PARTITIONS_PER_STATEMENT]
+            step.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {self.table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+                    f"({', '.join(step)})"
+                )
+        logger.info("Created %d partitions on %s (%s .. %s)", len(created), self.table, created[0], created[-1])
+        return created
+
+    def drop_partitions_before(self, cutoff: date) -> List[str]:
+        """Drop partitions whose rows are all older than cutoff (a date)."""
+        cutoff_days = _to_days(cutoff)
+        expired = [name for name, bound in self.list_partitions()
+                   if bound is not None and bound <= cutoff_days]
+        if not expired:
+            return []
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(f"ALTER TABLE {self.table} DROP PARTITION {', '.join(expired)}")
+        logger.info("Dropped %d expired partitions from %s: %s", len(expired), self.table, expired)
+        return expired
+
+    def apply_retention(self, retention_days: int, today: Optional[date] = None) -> List[str]:
+        today = today or datetime.now().date()
+        return self.drop_partitions_before(today - timedelta(days=retention_days))
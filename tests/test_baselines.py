@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from src.analysis.baselines import EndpointBaseline
+
+
+def make_baseline(durations):
+    baseline = EndpointBaseline()
+    durations = np.asarray(durations, dtype=np.float64)
+    baseline.update(durations, np.full(len(durations), 200))
+    return baseline
+
+
+def test_constant_latency():
+    stats = make_baseline([100.0] * 1000).latency_stats()
+    assert stats['median'] == pytest.approx(100, rel=0.04)
+    assert stats['p99'] == pytest.approx(100, rel=0.04)
+    assert stats['mad'] < 4
+    assert make_baseline([100.0] * 1000).latency_limit(mad_k=5.0, p99_factor=1.5, min_ms=50) < 160
+
+
+def test_narrow_distribution():
+    durations = np.random.default_rng(0).normal(100, 3, 100000)
+    stats = make_baseline(durations).latency_stats()
+    assert stats['median'] == pytest.approx(np.median(durations), rel=0.02)
+    assert stats['p99'] == pytest.approx(np.percentile(durations, 99), rel=0.02)
+    assert stats['mad'] == pytest.approx(np.median(np.abs(durations - np.median(durations))), rel=0.25)
+
+
+def test_lognormal_distribution():
+    durations = np.random.default_rng(1).lognormal(4, 0.8, 100000)
+    stats = make_baseline(durations).latency_stats()
+    assert stats['median'] == pytest.approx(np.median(durations), rel=0.01)
+    assert stats['p99'] == pytest.approx(np.percentile(durations, 99), rel=0.01)
+
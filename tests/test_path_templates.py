@@ -0,0 +1,25 @@
+from src.services.path_templates import MAX_TEMPLATE_LENGTH, PARAM, PathTemplater
+
+
+def test_ids_collapsed():
+    template, params = PathTemplater().template('/users/123/orders/456?page=2')
+    assert template == '/users/{param}/orders/{param}'
+    assert params == {'users': '123', 'orders': '456'}
+
+
+def test_long_numeric_path_fits_column():
+    path = '/items' + '/1' * 120
+    assert len(path) <= 255
+    template, params = PathTemplater().template(path)
+    assert len(template) <= MAX_TEMPLATE_LENGTH
+    assert template.startswith('/items/' + PARAM)
+    # Cut at a segment boundary, never inside a {param}
+    assert all(segment in ('items', PARAM) for segment in template.strip('/').split('/'))
+    assert len(params) == 120
+
+
+def test_long_template_is_stable():
+    templater = PathTemplater()
+    first, _ = templater.template('/items' + '/1' * 120)
+    second, _ = templater.template('/items' + '/22' * 80)
+    assert first == second